@@ -0,0 +1,74 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import threading
+import collections
+
+class SISLRUCache :
+	"""Thread safe LRU cache of values of known size, bounded by their total
+	size. The least recently used values are evicted first, except the
+	newest one, which stays even if it alone exceeds maxSize."""
+	def __init__(self, maxSize) :
+		self.maxSize = maxSize
+		self.entries = collections.OrderedDict() # key : (value, size)
+		self.size = 0
+		self.hits = 0
+		self.misses = 0
+		self.lock = threading.Lock()
+
+	def get(self, key) :
+		"""Returns the value of key, or None if it is not in the cache"""
+		self.lock.acquire()
+		try :
+			entry = self.entries.pop(key, None)
+			if entry is None :
+				self.misses += 1
+				return None
+			self.hits += 1
+			self.entries[key] = entry
+			return entry[0]
+		finally :
+			self.lock.release()
+
+	def put(self, key, value, size) :
+		self.lock.acquire()
+		try :
+			if key in self.entries :
+				return
+			self.entries[key] = (value, size)
+			self.size += size
+			while self.size > self.maxSize and len(self.entries) > 1 :
+				self.size -= self.entries.popitem(last = False)[1][1]
+		finally :
+			self.lock.release()
+
+	def readableStr(self) :
+		return "entries: " + str(len(self.entries)) + ", size: " + str(self.size) + \
+			", budget: " + str(self.maxSize) + ", hits: " + str(self.hits) + ", misses: " + str(self.misses)
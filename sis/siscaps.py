@@ -0,0 +1,164 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import array
+import numpy
+import siscorpus, sisfields
+
+CapabilityBits = dict([(name, bit) for (bit, name) in sisfields.CapabilityNames.items()])
+
+# Capabilities that the user can grant to a self-signed package
+UserCapabilities = ["NetworkServices", "LocalServices", "ReadUserData", "WriteUserData", "Location", "UserEnvironment"]
+
+def capabilityMask(names) :
+	"""Returns the capability bitmask of the capability names"""
+	result = 0
+	for name in names :
+		result |= 1 << CapabilityBits[name]
+	return result
+
+class SISCapabilityTable :
+	"""Capability bitmasks of all the files of a corpus. Row i of the
+	table is file fileIndices[i] of package packageIds[i], whose name is
+	packages[packageIds[i]]."""
+	def __init__(self) :
+		self.packages = []
+		self._packageIds = array.array("I")
+		self._fileIndices = array.array("I")
+		self._capabilities = array.array("I")
+		self.packageIds = None
+		self.fileIndices = None
+		self.capabilities = None
+		self._packageCapabilities = None
+
+	def addPackage(self, name, package) :
+		packageId = len(self.packages)
+		self.packages.append(name)
+		for f in package.files :
+			self._packageIds.append(packageId)
+			self._fileIndices.append(f.fileIndex)
+			self._capabilities.append(f.capabilities)
+		return packageId
+
+	def addFile(self, packageId, fileIndex, capabilities) :
+		self._packageIds.append(packageId)
+		self._fileIndices.append(fileIndex)
+		self._capabilities.append(capabilities)
+
+	def freeze(self) :
+		"""Converts the collected rows to the NumPy arrays used by the queries"""
+		self.packageIds = numpy.frombuffer(self._packageIds, dtype=numpy.uint32).copy()
+		self.fileIndices = numpy.frombuffer(self._fileIndices, dtype=numpy.uint32).copy()
+		self.capabilities = numpy.frombuffer(self._capabilities, dtype=numpy.uint32).copy()
+		self._packageCapabilities = None
+
+	def packageCapabilities(self) :
+		"""Returns the union of the file capabilities of each package"""
+		if self._packageCapabilities is None :
+			# The rows of a package are consecutive, so the union is a
+			# reduction over the row ranges of the packages
+			result = numpy.zeros(len(self.packages), dtype=numpy.uint32)
+			if len(self.capabilities) > 0 :
+				starts = numpy.searchsorted(self.packageIds, numpy.arange(len(self.packages)))
+				nonEmpty = numpy.nonzero(numpy.diff(numpy.append(starts, len(self.packageIds))))[0]
+				result[nonEmpty] = numpy.bitwise_or.reduceat(self.capabilities, starts[nonEmpty])
+			self._packageCapabilities = result
+		return self._packageCapabilities
+
+	def packagesRequesting(self, names, requireAll = True) :
+		"""Returns the packages requesting all (or with requireAll False, any)
+		of the capabilities"""
+		mask = numpy.uint32(capabilityMask(names))
+		requested = self.packageCapabilities() & mask
+		if requireAll :
+			found = numpy.nonzero(requested == mask)[0]
+		else :
+			found = numpy.nonzero(requested)[0]
+		return [self.packages[i] for i in found]
+
+	def histogram(self, perPackage = False) :
+		"""Returns a dictionary of capability name to the number of files (or
+		packages) requesting it"""
+		caps = self.capabilities
+		if perPackage :
+			caps = self.packageCapabilities()
+		# Count the values of each byte of the bitmasks and sum the counts of
+		# the byte values having the bit set
+		byteValues = numpy.arange(256)
+		bytes = caps.astype("<u4").view(numpy.uint8).reshape(-1, 4)
+		result = {}
+		for byte in range(3) :
+			counts = numpy.bincount(bytes[:, byte], minlength=256)
+			for bit in range(8) :
+				name = sisfields.CapabilityNames.get(byte * 8 + bit)
+				if name :
+					result[name] = int(counts[(byteValues >> bit) & 1 == 1].sum())
+		return result
+
+	def filesExceeding(self, declared) :
+		"""Returns the rows of the files requesting capabilities outside the
+		declared set. declared is either one bitmask for all the packages or
+		an array with a bitmask per package."""
+		declared = numpy.asarray(declared, dtype=numpy.uint32)
+		if declared.ndim > 0 :
+			declared = declared[self.packageIds]
+		return numpy.nonzero(self.capabilities & ~declared)[0]
+
+	def fileRow(self, row) :
+		"""Returns (package name, file index, capability bitmask) of a row"""
+		return (self.packages[self.packageIds[row]], int(self.fileIndices[row]), int(self.capabilities[row]))
+
+def collectCapabilities(path) :
+	"""Parses the SIS files under path, including those in zip and tar
+	archives, and returns their capability table and the list of (name,
+	error) of the files that could not be parsed"""
+	table = SISCapabilityTable()
+	failed = []
+	for (source, package) in siscorpus.parseSources(path, failed) :
+		table.addPackage(source.name, package)
+	table.freeze()
+	return (table, failed)
+
+def loadCapabilities(index) :
+	"""Returns the capability table of the packages in a sisindex.SISIndex
+	without parsing them again"""
+	table = SISCapabilityTable()
+	packageIds = {}
+	for (packageId, path) in index.db.execute("SELECT id, path FROM packages WHERE error IS NULL ORDER BY id") :
+		packageIds[packageId] = len(table.packages)
+		table.packages.append(path)
+	# The rows of a package must be consecutive and in the order of the
+	# package ids for packageCapabilities
+	for (packageId, fileIndex, capabilities) in index.db.execute("SELECT package_id, file_index, capabilities FROM files "
+			"ORDER BY package_id, rowid") :
+		if packageId in packageIds :
+			table.addFile(packageIds[packageId], fileIndex, capabilities)
+	table.freeze()
+	return table
@@ -0,0 +1,269 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import zlib
+import sisinfo, sisreader, sisfields, sispackage, siscorpus
+
+AlgorithmNames = {0 : "stored", 1 : "deflate"}
+
+SampleSize = 64 * 1024
+DefaultSamples = 8
+# makesis compresses with the zlib default level
+BaseLevel = 6
+HighLevel = 9
+
+def algorithmName(algorithm) :
+	return AlgorithmNames.get(algorithm, "unknown " + str(algorithm))
+
+def percentStr(part, whole) :
+	if whole == 0 :
+		return "-"
+	return "%.1f%%" % (100.0 * part / whole)
+
+class SISSampler :
+	"""Compresses evenly spaced samples of SampleSize bytes of a payload of
+	known size, read in chunks of any size. Reading stops after the last
+	sample, so the rest of a compressed payload is not decompressed. A
+	payload of at most numSamples samples is compressed whole. A single
+	sample is taken from the start."""
+	def __init__(self, size, numSamples = DefaultSamples) :
+		self.intervals = []
+		if size <= numSamples * SampleSize :
+			if size > 0 :
+				self.intervals.append((0, size))
+		else :
+			for i in range(numSamples) :
+				start = 0
+				if numSamples > 1 :
+					start = i * (size - SampleSize) // (numSamples - 1)
+				self.intervals.append((start, start + SampleSize))
+		self.sampledSize = 0
+		self.baseSize = 0
+		self.highSize = 0
+
+	def sample(self, chunks) :
+		position = 0
+		pending = list(self.intervals)
+		buffers = []
+		for chunk in chunks :
+			end = position + len(chunk)
+			while pending and pending[0][0] < end :
+				(start, stop) = pending[0]
+				buffers.append(chunk[max(start - position, 0):stop - position])
+				if stop > end :
+					break
+				self._compress("".join(buffers))
+				buffers = []
+				del pending[0]
+			if not pending :
+				return
+			position = end
+
+	def _compress(self, data) :
+		self.sampledSize += len(data)
+		self.baseSize += len(zlib.compress(data, BaseLevel))
+		self.highSize += len(zlib.compress(data, HighLevel))
+
+class SISCompressionEntry :
+	"""A compressed field of a SIS file: the controller or the contents of
+	a file. target is the install path of the first file using the
+	contents, if any."""
+	def __init__(self, name, target, compressedField, sampler = None) :
+		self.name = name
+		self.target = target
+		self.algorithm = compressedField.algorithm
+		self.compressedSize = compressedField.length - 4 - 8
+		self.uncompressedSize = compressedField.uncompressedDataSize
+		self.sampler = sampler
+
+	def estimatedHighSize(self) :
+		"""Estimated size compressed at HighLevel, or None without samples.
+		The gain of HighLevel over BaseLevel on the samples scales the
+		current size of a compressed payload, which cancels out most of the
+		compression context lost by compressing the samples separately. A
+		stored payload is scaled by the ratio of the samples."""
+		if self.sampler is None :
+			return None
+		if self.sampler.sampledSize == 0 :
+			return self.compressedSize
+		if self.algorithm == 1 :
+			return self.compressedSize * self.sampler.highSize // self.sampler.baseSize
+		return self.uncompressedSize * self.sampler.highSize // self.sampler.sampledSize
+
+	def bestSize(self) :
+		"""Smallest of the current size, the stored size and the estimated
+		size at HighLevel"""
+		sizes = [self.compressedSize, self.uncompressedSize]
+		if self.sampler is not None :
+			sizes.append(self.estimatedHighSize())
+		return min(sizes)
+
+	def readableStr(self) :
+		buf = self.name
+		if self.target :
+			buf += " " + self.target
+		buf += ": " + algorithmName(self.algorithm) + " " + str(self.compressedSize) + " / " + \
+			str(self.uncompressedSize) + " (" + percentStr(self.compressedSize, self.uncompressedSize) + ")"
+		if self.sampler is not None :
+			buf += ", level " + str(HighLevel) + " ~" + str(self.estimatedHighSize())
+		return buf
+
+class SISCompressionReport :
+	"""Compressed fields of a package, or the totals over a corpus. The
+	totals are kept per algorithm as [fields, compressed size, uncompressed
+	size]. estimated tells whether the sizes at HighLevel were estimated."""
+	def __init__(self, estimated = False) :
+		self.packages = 0
+		self.entries = []
+		self.byAlgorithm = {}
+		self.estimated = estimated
+		self.estimatedHighSize = 0
+		self.bestSize = 0
+
+	def addEntry(self, entry) :
+		self.entries.append(entry)
+		totals = self.byAlgorithm.setdefault(entry.algorithm, [0, 0, 0])
+		totals[0] += 1
+		totals[1] += entry.compressedSize
+		totals[2] += entry.uncompressedSize
+		if self.estimated :
+			self.estimatedHighSize += entry.estimatedHighSize()
+		self.bestSize += entry.bestSize()
+
+	def add(self, other) :
+		"""Adds the totals of another report, not its entries"""
+		self.packages += other.packages
+		for (algorithm, (fields, compressed, uncompressed)) in other.byAlgorithm.items() :
+			totals = self.byAlgorithm.setdefault(algorithm, [0, 0, 0])
+			totals[0] += fields
+			totals[1] += compressed
+			totals[2] += uncompressed
+		self.estimatedHighSize += other.estimatedHighSize
+		self.bestSize += other.bestSize
+
+	def compressedSize(self) :
+		return sum([t[1] for t in self.byAlgorithm.values()])
+
+	def uncompressedSize(self) :
+		return sum([t[2] for t in self.byAlgorithm.values()])
+
+	def readableStr(self, withEntries = True) :
+		lines = []
+		if withEntries :
+			lines += [e.readableStr() for e in self.entries]
+		for algorithm in sorted(self.byAlgorithm.keys()) :
+			(fields, compressed, uncompressed) = self.byAlgorithm[algorithm]
+			lines.append("Total " + algorithmName(algorithm) + ": " + str(fields) + " fields, " + str(compressed) + \
+				" / " + str(uncompressed) + " (" + percentStr(compressed, uncompressed) + ")")
+		compressed = self.compressedSize()
+		uncompressed = self.uncompressedSize()
+		lines.append("Total: " + str(compressed) + " / " + str(uncompressed) + " (" + percentStr(compressed, uncompressed) + ")")
+		if self.estimated :
+			lines.append("Estimated at level " + str(HighLevel) + ": " + str(self.estimatedHighSize) + \
+				" (" + percentStr(self.estimatedHighSize, compressed) + " of the current size)")
+		lines.append("Best of current, stored" + (self.estimated and " and level " + str(HighLevel) or "") + ": " + \
+			str(self.bestSize) + ", saving " + str(compressed - self.bestSize) + " bytes")
+		return "\n".join(lines)
+
+class _SampleHandler :
+	def __init__(self, fileReader, numSamples) :
+		self.fileReader = fileReader
+		self.numSamples = numSamples
+		self.samplers = {}
+
+	def handlePayload(self, field, chunks) :
+		sampler = SISSampler(field.uncompressedDataSize, self.numSamples)
+		sampler.sample(chunks)
+		self.samplers[(self.fileReader.dataUnitIndex, self.fileReader.fileDataIndex)] = sampler
+
+def sourceCompression(source, estimate = False, numSamples = DefaultSamples, limits = None) :
+	"""Returns the SISCompressionReport of a package source. Without
+	estimate the file contents are skipped. With estimate they are read in
+	one pass and sampled, decompressing each payload up to its last
+	sample."""
+	sisInfo = sisinfo.SISInfo()
+	handler = None
+	stream = source.open()
+	try :
+		if estimate :
+			fileReader = sisreader.SISFileReader(stream, limits = limits, size = source.size)
+			handler = _SampleHandler(fileReader, numSamples)
+			fileReader.payloadHandler = handler.handlePayload
+			sisInfo.ioStatistics = fileReader.stats
+			sisInfo.parseHeader(fileReader)
+			sisInfo.parseSISFields(fileReader)
+		else :
+			sisInfo.parseStream(stream, limits = limits, skipFileData = True, size = source.size)
+	finally :
+		stream.close()
+	package = sispackage.SISPackage(sisInfo)
+	report = SISCompressionReport(estimate)
+	report.packages = 1
+	for field in sisInfo.subFields :
+		if field and field.type == sisfields.ContentsField and field.compressedController :
+			controller = field.compressedController
+			sampler = None
+			if estimate :
+				sampler = SISSampler(len(controller.data), numSamples)
+				sampler.sample([controller.data])
+			report.addEntry(SISCompressionEntry("controller", None, controller, sampler))
+	targets = {}
+	for f in package.files :
+		targets.setdefault(f.fileIndex, f.target)
+	for (unit, fileDatas) in enumerate(package.fileDatas) :
+		for (index, fileData) in enumerate(fileDatas) :
+			target = None
+			if unit == package.dataIndex :
+				target = targets.get(index)
+			sampler = None
+			if handler :
+				sampler = handler.samplers.get((unit, index))
+			name = "file " + str(index)
+			if len(package.fileDatas) > 1 :
+				name = "data unit " + str(unit) + " " + name
+			report.addEntry(SISCompressionEntry(name, target, fileData.subFields[0], sampler))
+	return report
+
+def packageCompression(filename, estimate = False, numSamples = DefaultSamples) :
+	return sourceCompression(siscorpus.SISFileSource(filename), estimate, numSamples)
+
+def corpusCompression(path, estimate = False, numSamples = DefaultSamples, handler = None) :
+	"""Returns the sum of the compression reports of the SIS files under
+	path and the list of (name, error) of the files that could not be
+	parsed. If given, handler is called with the name and report of each
+	package."""
+	total = SISCompressionReport(estimate)
+	failed = []
+	parse = lambda source : sourceCompression(source, estimate, numSamples)
+	for (source, report) in siscorpus.parseSources(path, failed, parse) :
+		if handler :
+			handler(source.name, report)
+		total.add(report)
+	return (total, failed)
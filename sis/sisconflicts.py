@@ -0,0 +1,95 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import binascii
+import sispackage, siscorpus, sisfootprint
+
+class SISPathOwner :
+	def __init__(self, name, uid, packageFile) :
+		self.name = name
+		self.uid = uid
+		self.target = packageFile.target
+		self.hashDigest = packageFile.hashDigest
+		self.uncompressedLength = packageFile.uncompressedLength
+
+class SISConflict :
+	"""Packages installing the same path. identical is True if all the
+	files have the same hash, i.e. the packages only duplicate the file."""
+	def __init__(self, path, owners) :
+		self.path = path
+		self.owners = owners
+		digests = set([o.hashDigest for o in owners])
+		self.identical = len(digests) == 1 and None not in digests
+
+	def readableStr(self) :
+		kind = "different"
+		if self.identical :
+			kind = "identical"
+		buf = self.path + " (" + kind + ")"
+		for o in self.owners :
+			digest = "no hash"
+			if o.hashDigest is not None :
+				digest = binascii.hexlify(o.hashDigest)
+			buf += "\n   " + o.name + " [" + hex(o.uid) + "] " + o.target + " " + digest
+		return buf
+
+class SISConflictIndex :
+	"""Hash index from the normalized install paths to the packages
+	installing them. Files that are not installed (text shown during the
+	install and null files) are left out. Packages with the same UID
+	replace each other on the device, so a path only conflicts if packages
+	of two or more UIDs install it."""
+	def __init__(self) :
+		self.paths = {}
+
+	def addPackage(self, name, package) :
+		for f in package.files :
+			if f.operation in sisfootprint.InstalledOperations :
+				key = sispackage.normalizeTargetPath(f.target)
+				self.paths.setdefault(key, []).append(SISPathOwner(name, package.uid, f))
+
+	def conflicts(self) :
+		"""Returns the SISConflicts sorted by path"""
+		result = []
+		for path in sorted(self.paths.keys()) :
+			owners = self.paths[path]
+			if len(owners) > 1 and len(set([o.uid for o in owners])) > 1 :
+				result.append(SISConflict(path, owners))
+		return result
+
+def findConflicts(path) :
+	"""Builds the conflict index of the SIS files under path from their
+	file descriptions. Returns the index and the list of (name, error) of
+	the files that could not be parsed."""
+	index = SISConflictIndex()
+	failed = []
+	for (source, package) in siscorpus.parseSources(path, failed) :
+		index.addPackage(source.name, package)
+	return (index, failed)
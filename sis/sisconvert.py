@@ -0,0 +1,210 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import struct
+import tarfile
+import time
+import zipfile
+import zlib
+import sisinfo, sisfields, sisreader, sispackage
+
+def archiveName(target) :
+	"""Returns the archive member name of an install path, the path without
+	the drive with / separators, or None if the target is not a file"""
+	parts = target.split("\\")
+	if len(parts[-1]) == 0 :
+		return None
+	return "/".join(parts[1:]).encode("utf-8")
+
+class _ChunkReader :
+	"""File like object reading from an iterator of strings"""
+	def __init__(self, chunks) :
+		self.chunks = iter(chunks)
+		self.buffer = ""
+
+	def read(self, size = -1) :
+		while size < 0 or len(self.buffer) < size :
+			try :
+				self.buffer += self.chunks.next()
+			except StopIteration :
+				break
+		if size < 0 :
+			size = len(self.buffer)
+		result = self.buffer[:size]
+		self.buffer = self.buffer[size:]
+		return result
+
+class SISTarWriter :
+	"""Writes the files as a tar stream, without seeking the output"""
+	supportsLinks = True
+
+	def __init__(self, outStream) :
+		self.tar = tarfile.open(fileobj = outStream, mode = "w|", format = tarfile.PAX_FORMAT, encoding = "utf-8")
+		self.mtime = int(time.time())
+
+	def _info(self, name) :
+		info = tarfile.TarInfo(name)
+		info.mtime = self.mtime
+		info.mode = 0644
+		return info
+
+	def addFile(self, name, size, chunks) :
+		info = self._info(name)
+		info.size = size
+		self.tar.addfile(info, _ChunkReader(chunks))
+
+	def addLink(self, name, target) :
+		info = self._info(name)
+		info.type = tarfile.LNKTYPE
+		info.linkname = target
+		self.tar.addfile(info)
+
+	def close(self) :
+		self.tar.close()
+
+class SISZipWriter :
+	"""Writes the files as a zip stream, without seeking the output. The
+	sizes and CRCs follow the compressed data in data descriptors. Zip64 is
+	not supported, the files and the archive must stay below 4 GB."""
+	supportsLinks = False
+
+	def __init__(self, outStream, compressLevel = 6) :
+		self.out = outStream
+		self.compressLevel = compressLevel
+		self.offset = 0
+		self.entries = [] # (name, crc, compressed size, size, offset)
+		t = time.localtime()
+		self.dosTime = (t[3] << 11) | (t[4] << 5) | (t[5] // 2)
+		self.dosDate = ((t[0] - 1980) << 9) | (t[1] << 5) | t[2]
+
+	def _write(self, data) :
+		self.out.write(data)
+		self.offset += len(data)
+
+	def addFile(self, name, size, chunks) :
+		offset = self.offset
+		self._write(struct.pack(zipfile.structFileHeader, zipfile.stringFileHeader, 20, 0, 0x808, zipfile.ZIP_DEFLATED,
+			self.dosTime, self.dosDate, 0, 0, 0, len(name), 0) + name)
+		compressor = zlib.compressobj(self.compressLevel, zlib.DEFLATED, -15)
+		crc = 0
+		size = 0
+		compressedSize = 0
+		for chunk in chunks :
+			crc = zlib.crc32(chunk, crc)
+			size += len(chunk)
+			data = compressor.compress(chunk)
+			compressedSize += len(data)
+			self._write(data)
+		data = compressor.flush()
+		compressedSize += len(data)
+		self._write(data)
+		if size > 0xffffffff or compressedSize > 0xffffffff or self.offset > 0xffffffff :
+			raise Exception("Zip stream over 4 GB is not supported, use a tar stream")
+		crc &= 0xffffffff
+		self._write(struct.pack("<4s3L", "PK\007\010", crc, compressedSize, size))
+		self.entries.append((name, crc, compressedSize, size, offset))
+
+	def close(self) :
+		start = self.offset
+		for (name, crc, compressedSize, size, offset) in self.entries :
+			self._write(struct.pack(zipfile.structCentralDir, zipfile.stringCentralDir, 20, 3, 20, 0, 0x808,
+				zipfile.ZIP_DEFLATED, self.dosTime, self.dosDate, crc, compressedSize, size, len(name), 0, 0, 0, 0,
+				0644 << 16, offset) + name)
+		if len(self.entries) > 0xffff :
+			raise Exception("Zip stream of over 65535 files is not supported, use a tar stream")
+		self._write(struct.pack(zipfile.structEndArchive, zipfile.stringEndArchive, 0, 0, len(self.entries),
+			len(self.entries), self.offset - start, start, 0))
+		self.out.flush()
+
+class SISStreamConverter :
+	"""Converts a SIS file to an archive of its files in one forward pass
+	over the SIS file. The controller precedes the file contents in the SIS
+	file, so the install paths are known when the contents are read. Each
+	file is passed to the writer in pieces as it is read and decompressed,
+	only the controller is kept in memory.
+
+	The files installed to several paths are written once and linked to
+	the other paths if the writer supports links, otherwise only the first
+	path is written and the others are listed in skipped."""
+	def __init__(self, writer) :
+		self.writer = writer
+		self.sisInfo = sisinfo.SISInfo()
+		self.fileReader = None
+		self.targets = None
+		self.dataUnit = 0
+		self.files = 0
+		self.skipped = []
+
+	def convert(self, inStream, blockSize = sisreader.DefaultBlockSize, readAhead = sisreader.DefaultReadAhead, limits = None) :
+		self.fileReader = sisreader.SISFileReader(inStream, blockSize, readAhead, limits)
+		self.fileReader.payloadHandler = self.handlePayload
+		self.sisInfo.ioStatistics = self.fileReader.stats
+		self.sisInfo.parseHeader(self.fileReader)
+		type = self.fileReader.readBytesAsUint(4)
+		if type != sisfields.ContentsField :
+			raise Exception("Not a SIS file, contents field missing")
+		# The contents field is added before parsing it, so that the
+		# controller is reachable once the file data is reached
+		contents = sisfields.SISContentsField()
+		contents.type = type
+		self.sisInfo.subFields.append(contents)
+		contents.initFromFile(self.fileReader)
+		self.writer.close()
+
+	def _mapTargets(self) :
+		package = sispackage.SISPackage(self.sisInfo)
+		self.targets = {}
+		self.dataUnit = package.dataIndex
+		for f in package.files :
+			# Called before the first file is written, so a file over the
+			# limits fails the conversion before any output
+			self.fileReader.context.checkStreamedSize(f.compressedLength, f.uncompressedLength)
+			name = archiveName(f.target)
+			if name :
+				names = self.targets.setdefault(f.fileIndex, [])
+				if name not in names :
+					names.append(name)
+
+	def handlePayload(self, field, chunks) :
+		if self.targets is None :
+			self._mapTargets()
+		if self.fileReader.dataUnitIndex != self.dataUnit :
+			return
+		names = self.targets.get(self.fileReader.fileDataIndex)
+		if not names :
+			return
+		self.writer.addFile(names[0], field.uncompressedDataSize, chunks)
+		self.files += 1
+		for name in names[1:] :
+			if self.writer.supportsLinks :
+				self.writer.addLink(name, names[0])
+				self.files += 1
+			else :
+				self.skipped.append(name)
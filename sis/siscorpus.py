@@ -0,0 +1,308 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import mmap
+import errno
+import struct
+import tarfile
+import zipfile
+import hashlib
+import sisinfo, sispackage
+
+PackageExtensions = (".sis", ".sisx")
+ArchiveExtensions = (".zip", ".tar", ".tgz", ".tar.gz", ".tbz2", ".tar.bz2")
+
+# Separates the archive path and the member name in the source names
+MemberSeparator = "!"
+
+def isPackageFile(filename) :
+	return os.path.splitext(filename)[1].lower() in PackageExtensions
+
+def isArchiveFile(filename) :
+	filename = filename.lower()
+	for extension in ArchiveExtensions :
+		if filename.endswith(extension) :
+			return True
+	return False
+
+class SISFileSource :
+	"""A SIS file on disk. The sources have the name, size and mtime
+	attributes and open() returning a stream of the SIS file."""
+	def __init__(self, filename) :
+		self.name = filename
+		st = os.stat(filename)
+		self.size = st.st_size
+		self.mtime = st.st_mtime
+
+	def open(self) :
+		return open(self.name, "rb", 0)
+
+class SISRangeStream :
+	"""Seekable read only stream over a range of a buffer, e.g. a mmap"""
+	def __init__(self, buffer, start, length) :
+		self.buffer = buffer
+		self.start = start
+		self.length = length
+		self.pos = 0
+
+	def read(self, size = -1) :
+		if size < 0 or size > self.length - self.pos :
+			size = max(self.length - self.pos, 0)
+		result = self.buffer[self.start + self.pos:self.start + self.pos + size]
+		self.pos += len(result)
+		return result
+
+	def seek(self, offset, whence = 0) :
+		if whence == 1 :
+			offset += self.pos
+		elif whence == 2 :
+			offset += self.length
+		self.pos = max(offset, 0)
+
+	def tell(self) :
+		return self.pos
+
+	def close(self) :
+		pass
+
+class SISZipMemberSource :
+	"""A SIS file in a zip archive. Stored members are read from the memory
+	mapped archive, compressed ones are decompressed while read."""
+	def __init__(self, zipFile, info, archiveName, mtime, mapped) :
+		self.zipFile = zipFile
+		self.info = info
+		self.name = archiveName + MemberSeparator + info.filename
+		self.size = info.file_size
+		self.mtime = mtime
+		self.mapped = mapped
+
+	def open(self) :
+		info = self.info
+		if self.mapped is not None and info.compress_type == zipfile.ZIP_STORED and not info.flag_bits & 0x01 :
+			header = struct.unpack(zipfile.structFileHeader, self.mapped[info.header_offset:info.header_offset + zipfile.sizeFileHeader])
+			start = info.header_offset + zipfile.sizeFileHeader + header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH]
+			return SISRangeStream(self.mapped, start, info.compress_size)
+		return self.zipFile.open(info)
+
+class SISTarMemberSource :
+	"""A SIS file in a tar archive. The source is valid only until the next
+	member of the archive is read."""
+	def __init__(self, tarFile, member, archiveName) :
+		self.tarFile = tarFile
+		self.member = member
+		self.name = archiveName + MemberSeparator + member.name
+		self.size = member.size
+		self.mtime = member.mtime
+
+	def open(self) :
+		return self.tarFile.extractfile(self.member)
+
+class SISErrorSource :
+	"""An archive that could not be read, open() raises the error"""
+	def __init__(self, name, error) :
+		self.name = name
+		self.size = None
+		self.mtime = None
+		self.error = error
+
+	def open(self) :
+		raise self.error
+
+def _zipSources(filename) :
+	zipFile = zipfile.ZipFile(filename)
+	fin = open(filename, "rb")
+	mapped = None
+	try :
+		if os.path.getsize(filename) > 0 :
+			try :
+				mapped = mmap.mmap(fin.fileno(), 0, access = mmap.ACCESS_READ)
+			except (EnvironmentError, ValueError) :
+				pass
+		mtime = os.path.getmtime(filename)
+		for info in sorted(zipFile.infolist(), key = lambda i : i.filename) :
+			if isPackageFile(info.filename) :
+				yield SISZipMemberSource(zipFile, info, filename, mtime, mapped)
+	finally :
+		if mapped is not None :
+			mapped.close()
+		fin.close()
+		zipFile.close()
+
+def _tarSources(filename) :
+	tarFile = tarfile.open(filename)
+	try :
+		for member in tarFile :
+			if member.isfile() and isPackageFile(member.name) :
+				yield SISTarMemberSource(tarFile, member, filename)
+	finally :
+		tarFile.close()
+
+def archiveSources(filename) :
+	"""Yields the sources of the SIS files in a zip or tar archive, in the
+	order of the archive for tar and by name for zip"""
+	try :
+		if zipfile.is_zipfile(filename) :
+			sources = _zipSources(filename)
+		else :
+			sources = _tarSources(filename)
+		for source in sources :
+			yield source
+	except (zipfile.BadZipfile, tarfile.TarError, EnvironmentError), err :
+		yield SISErrorSource(filename, err)
+
+def findPackageSources(path) :
+	"""Yields the sources of the SIS files found under path in sorted order,
+	including the SIS files in the zip and tar archives under path without
+	unpacking them. If path is a file, its source is yielded as such. A
+	source must be used before the next one is taken. A missing path is
+	yielded as a source whose open() raises the error."""
+	if not os.path.exists(path) :
+		yield SISErrorSource(path, IOError(errno.ENOENT, os.strerror(errno.ENOENT), path))
+		return
+	if not os.path.isdir(path) :
+		if isArchiveFile(path) :
+			for source in archiveSources(path) :
+				yield source
+		else :
+			yield SISFileSource(path)
+		return
+	for root, dirs, files in os.walk(path) :
+		dirs.sort()
+		for name in sorted(files) :
+			filename = os.path.join(root, name)
+			if isPackageFile(name) :
+				yield SISFileSource(filename)
+			elif isArchiveFile(name) :
+				for source in archiveSources(filename) :
+					yield source
+
+def parseSource(source, metadataOnly = False, limits = None) :
+	"""Parses the SIS file of a source and returns the sisinfo.SISInfo"""
+	stream = source.open()
+	try :
+		sisInfo = sisinfo.SISInfo()
+		sisInfo.parseStream(stream, metadataOnly = metadataOnly, limits = limits, size = source.size)
+	finally :
+		stream.close()
+	return sisInfo
+
+def parseSources(path, failed, parse = None) :
+	"""Yields (source, result) of the SIS files under path, found as by
+	findPackageSources. result is the sispackage.SISPackage of the file
+	descriptions or, if given, parse(source). The (name, error) of the
+	sources that could not be parsed are appended to failed."""
+	for source in findPackageSources(path) :
+		try :
+			if parse is None :
+				result = sispackage.SISPackage(parseSource(source, metadataOnly = True))
+			else :
+				result = parse(source)
+		except Exception, err :
+			failed.append((source.name, err))
+			continue
+		yield (source, result)
+
+class SISDigestStream :
+	"""Read only stream computing the SHA-1 of the data read from stream, so
+	that a source is parsed and hashed in one pass. Seeking forward reads
+	and hashes the skipped bytes. The end of the stream is known from size
+	without reading up to it, so the readers can find the stream size."""
+	def __init__(self, stream, size) :
+		self.stream = stream
+		self.size = size
+		self.pos = 0
+		self.endPos = None
+		self.digest = hashlib.sha1()
+
+	def read(self, size = -1) :
+		buf = self.stream.read(size)
+		self.digest.update(buf)
+		self.pos += len(buf)
+		return buf
+
+	def tell(self) :
+		if self.endPos is not None :
+			return self.endPos
+		return self.pos
+
+	def seek(self, offset, whence = 0) :
+		if whence == 2 :
+			if self.size is None :
+				raise IOError("Stream size not known")
+			self.endPos = self.size + offset
+			return
+		if whence == 1 :
+			offset += self.tell()
+		self.endPos = None
+		if offset < self.pos :
+			raise IOError("Cannot seek backwards in a digest stream")
+		while self.pos < offset :
+			if not self.read(min(offset - self.pos, 1 << 20)) :
+				break
+
+	def drain(self) :
+		"""Reads and hashes the rest of the stream"""
+		while self.read(1 << 20) :
+			pass
+
+	def hexdigest(self) :
+		return self.digest.hexdigest()
+
+	def close(self) :
+		self.stream.close()
+
+def parseSourceDigest(source, metadataOnly = False, limits = None) :
+	"""Parses the SIS file of a source like parseSource and computes its
+	SHA-1 in the same pass, reading the source only once. Returns
+	(sisInfo, sha1, error): sisInfo is None and error is the exception if
+	the parse failed, and sha1 is None if the source could not be read."""
+	try :
+		stream = SISDigestStream(source.open(), source.size)
+	except Exception, err :
+		return (None, None, err)
+	sisInfo = None
+	sha1 = None
+	error = None
+	try :
+		try :
+			sisInfo = sisinfo.SISInfo()
+			sisInfo.parseStream(stream, metadataOnly = metadataOnly, limits = limits)
+		except Exception, err :
+			sisInfo = None
+			error = err
+		try :
+			stream.drain()
+			sha1 = stream.hexdigest()
+		except Exception, err :
+			error = error or err
+	finally :
+		stream.close()
+	return (sisInfo, sha1, error)
@@ -0,0 +1,175 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import stat
+import urlparse
+import BaseHTTPServer
+import SocketServer
+from cStringIO import StringIO
+import sisinfo, sispackage, siscache
+
+DefaultMemoryBudget = 256 * 1024 * 1024
+FieldOverhead = 256 # Rough size of a parsed field object without its data
+
+def estimateSize(sisInfo) :
+	"""Estimates the memory used by a parsed SIS tree including the
+	decompressed payloads"""
+	result = 0
+	fields = [sisInfo]
+	while fields :
+		field = fields.pop()
+		if field is None :
+			continue
+		result += FieldOverhead
+		data = getattr(field, "data", None)
+		if isinstance(data, basestring) :
+			result += len(data)
+		fields.extend(field.subFields)
+	return result
+
+class SISCacheEntry :
+	def __init__(self, sisInfo) :
+		self.sisInfo = sisInfo
+		self.package = sispackage.SISPackage(sisInfo)
+		self.size = estimateSize(sisInfo)
+
+class SISCache(siscache.SISLRUCache) :
+	"""LRU cache of parsed SIS files bounded by an estimated memory budget.
+	Entries are keyed by path, size and modification time, so a changed
+	file is parsed again."""
+	def __init__(self, memoryBudget = DefaultMemoryBudget, limits = None) :
+		siscache.SISLRUCache.__init__(self, memoryBudget)
+		self.limits = limits
+
+	def get(self, filename) :
+		st = os.stat(filename)
+		key = (os.path.abspath(filename), st.st_size, st.st_mtime)
+		entry = siscache.SISLRUCache.get(self, key)
+		if entry is None :
+			sisInfo = sisinfo.SISInfo()
+			sisInfo.parse(filename, limits = self.limits)
+			entry = SISCacheEntry(sisInfo)
+			self.put(key, entry, entry.size)
+		return entry
+
+class SISRequestError(Exception) :
+	def __init__(self, code, message) :
+		Exception.__init__(self, message)
+		self.code = code
+
+def extractRoute(entry, params, out) :
+	"""Writes the payload of the file installed to the given path"""
+	if "path" not in params :
+		raise SISRequestError(400, "Missing parameter: path")
+	key = sispackage.normalizeTargetPath(params["path"].decode("utf-8"))
+	package = entry.package
+	for f in package.files :
+		if sispackage.normalizeTargetPath(f.target) == key :
+			if package.dataIndex >= len(package.fileDatas) or f.fileIndex >= len(package.fileDatas[package.dataIndex]) :
+				raise SISRequestError(404, "No contents for file in package: " + params["path"])
+			out.write(package.payload(f.fileIndex, package.dataIndex))
+			return "application/octet-stream"
+	raise SISRequestError(404, "No such file in package: " + params["path"])
+
+class SISRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler) :
+	def do_GET(self) :
+		url = urlparse.urlparse(self.path)
+		params = dict(urlparse.parse_qsl(url.query))
+		out = StringIO()
+		try :
+			if url.path == "/stats" :
+				out.write(self.server.cache.readableStr() + "\n")
+				contentType = "text/plain"
+			elif url.path[1:] in self.server.routes :
+				if "file" not in params :
+					raise SISRequestError(400, "Missing parameter: file")
+				if not os.path.isfile(params["file"]) :
+					raise SISRequestError(404, "No such file: " + params["file"])
+				entry = self.server.cache.get(params["file"])
+				contentType = self.server.routes[url.path[1:]](entry, params, out)
+			else :
+				raise SISRequestError(404, "Unknown request: " + url.path)
+		except SISRequestError, err :
+			self.send_error(err.code, str(err))
+			return
+		except Exception, err :
+			self.send_error(500, err.__class__.__name__ + ": " + str(err))
+			return
+		data = out.getvalue()
+		self.send_response(200)
+		self.send_header("Content-Type", contentType)
+		self.send_header("Content-Length", str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+
+	def address_string(self) :
+		if isinstance(self.client_address, tuple) :
+			return self.client_address[0]
+		return "unix"
+
+	def log_message(self, format, *args) :
+		if not self.server.quiet :
+			BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class SISServerMixIn :
+	def initServer(self, routes, memoryBudget, quiet, limits) :
+		self.routes = {"extract" : extractRoute}
+		self.routes.update(routes)
+		self.cache = SISCache(memoryBudget, limits)
+		self.quiet = quiet
+
+class SISHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer, SISServerMixIn) :
+	daemon_threads = True
+
+class SISUnixServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer, SISServerMixIn) :
+	daemon_threads = True
+
+def createServer(address, routes = {}, memoryBudget = DefaultMemoryBudget, quiet = False, limits = None) :
+	"""Creates a server answering HTTP GET requests. address is either
+	a port number, a host:port pair or a Unix socket path. routes maps the
+	request names to functions taking the cache entry, the request
+	parameters and an output stream and returning the content type.
+	limits is the sisreader.SISLimits of the parses."""
+	if ":" in address or address.isdigit() :
+		host = "localhost"
+		port = address
+		if ":" in address :
+			(host, port) = address.rsplit(":", 1)
+		server = SISHTTPServer((host, int(port)), SISRequestHandler)
+	else :
+		if os.path.lexists(address) :
+			# Only a socket left by a previous run is replaced
+			if not stat.S_ISSOCK(os.lstat(address).st_mode) :
+				raise Exception(address + " exists and is not a socket")
+			os.remove(address)
+		server = SISUnixServer(address, SISRequestHandler)
+	server.initServer(routes, memoryBudget, quiet, limits)
+	return server
@@ -0,0 +1,238 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import bisect
+import siscorpus
+
+def parseVersion(version) :
+	"""Parses a version string like 1.2.3 to a tuple, None stays None"""
+	if version is None :
+		return None
+	return tuple([int(v) for v in version.split(".")])
+
+class SISDependencyGraph :
+	"""Package dependencies of a corpus. Packages are added and removed one
+	at a time and keyed by their path. providers maps each UID to the
+	versions and keys of the packages having it sorted by version, so a
+	dependency resolves with a binary search. The dependency cycles are
+	computed on the first query after a change."""
+	def __init__(self) :
+		self.packages = {} # key : (uid, version, [(uid, from version, to version)])
+		self.providerVersions = {}
+		self.providerKeys = {}
+		self.dependents = {} # uid : set of keys of the packages depending on it
+		self._cycles = None
+
+	def addPackage(self, key, uid, version, dependencies) :
+		"""Adds or replaces a package. version is a tuple and dependencies a
+		list of (uid, from version, to version), where a version bound of
+		None is open"""
+		if key in self.packages :
+			self.removePackage(key)
+		version = version or ()
+		self.packages[key] = (uid, version, list(dependencies))
+		versions = self.providerVersions.setdefault(uid, [])
+		i = bisect.bisect_right(versions, version)
+		versions.insert(i, version)
+		self.providerKeys.setdefault(uid, []).insert(i, key)
+		for (dependencyUid, fromVersion, toVersion) in dependencies :
+			self.dependents.setdefault(dependencyUid, set()).add(key)
+		self._cycles = None
+
+	def addSISPackage(self, key, package) :
+		self.addPackage(key, package.uid, package.version,
+			[(d.uid, d.fromVersion, d.toVersion) for d in package.dependencies])
+
+	def removePackage(self, key) :
+		(uid, version, dependencies) = self.packages.pop(key)
+		keys = self.providerKeys[uid]
+		i = keys.index(key)
+		del keys[i]
+		del self.providerVersions[uid][i]
+		if not keys :
+			del self.providerKeys[uid]
+			del self.providerVersions[uid]
+		for (dependencyUid, fromVersion, toVersion) in dependencies :
+			dependents = self.dependents.get(dependencyUid)
+			if dependents is not None :
+				dependents.discard(key)
+				if not dependents :
+					del self.dependents[dependencyUid]
+		self._cycles = None
+
+	def resolve(self, uid, fromVersion = None, toVersion = None) :
+		"""Returns the key of the package with the UID and the highest version
+		in the range, or None if no package satisfies the dependency"""
+		versions = self.providerVersions.get(uid)
+		if not versions :
+			return None
+		i = len(versions)
+		if toVersion is not None :
+			i = bisect.bisect_right(versions, toVersion)
+		if i == 0 :
+			return None
+		if fromVersion is not None and versions[i - 1] < fromVersion :
+			return None
+		return self.providerKeys[uid][i - 1]
+
+	def missing(self, key) :
+		"""Returns the (key, uid, from version, to version) of the dependencies
+		that no package satisfies, of the package and of the packages it
+		depends on"""
+		result = []
+		visited = set([key])
+		stack = [key]
+		while stack :
+			current = stack.pop()
+			for (uid, fromVersion, toVersion) in self.packages[current][2] :
+				provider = self.resolve(uid, fromVersion, toVersion)
+				if provider is None :
+					result.append((current, uid, fromVersion, toVersion))
+				elif provider not in visited :
+					visited.add(provider)
+					stack.append(provider)
+		return result
+
+	def dependentsOf(self, low, high = None) :
+		"""Returns the keys of the packages depending on a UID in the inclusive
+		range [low, high]"""
+		if high is None or high == low :
+			return sorted(self.dependents.get(low, ()))
+		result = set()
+		for (uid, keys) in self.dependents.items() :
+			if low <= uid <= high :
+				result.update(keys)
+		return sorted(result)
+
+	def cycles(self) :
+		"""Returns the dependency cycles as lists of package keys. Each
+		dependency is resolved to its highest satisfying version."""
+		if self._cycles is None :
+			self._cycles = self._findCycles()
+		return self._cycles
+
+	def _edges(self, key) :
+		result = []
+		for (uid, fromVersion, toVersion) in self.packages[key][2] :
+			provider = self.resolve(uid, fromVersion, toVersion)
+			if provider is not None :
+				result.append(provider)
+		return result
+
+	def _findCycles(self) :
+		# Tarjan's strongly connected components without recursion
+		indices = {}
+		lowLinks = {}
+		onStack = set()
+		stack = []
+		result = []
+		for root in sorted(self.packages.keys()) :
+			if root in indices :
+				continue
+			work = [(root, iter(self._edges(root)))]
+			indices[root] = lowLinks[root] = len(indices)
+			stack.append(root)
+			onStack.add(root)
+			while work :
+				(node, edges) = work[-1]
+				advanced = False
+				for target in edges :
+					if target not in indices :
+						indices[target] = lowLinks[target] = len(indices)
+						stack.append(target)
+						onStack.add(target)
+						work.append((target, iter(self._edges(target))))
+						advanced = True
+						break
+					elif target in onStack :
+						lowLinks[node] = min(lowLinks[node], indices[target])
+				if advanced :
+					continue
+				work.pop()
+				if work :
+					parent = work[-1][0]
+					lowLinks[parent] = min(lowLinks[parent], lowLinks[node])
+				if lowLinks[node] == indices[node] :
+					component = []
+					while True :
+						member = stack.pop()
+						onStack.discard(member)
+						component.append(member)
+						if member == node :
+							break
+					if len(component) > 1 or node in self._edges(node) :
+						result.append(sorted(component))
+		return result
+
+def collectDependencies(path) :
+	"""Parses the SIS files under path, including those in zip and tar
+	archives, and returns their dependency graph and the list of (name,
+	error) of the files that could not be parsed"""
+	graph = SISDependencyGraph()
+	failed = []
+	for (source, package) in siscorpus.parseSources(path, failed) :
+		graph.addSISPackage(source.name, package)
+	return (graph, failed)
+
+def loadDependencyGraph(index) :
+	"""Returns the dependency graph of the packages in a sisindex.SISIndex
+	without parsing them again"""
+	graph = SISDependencyGraph()
+	dependencies = {}
+	for (packageId, uid, fromVersion, toVersion) in index.db.execute("SELECT package_id, uid, from_version, to_version "
+			"FROM dependencies WHERE kind = 'package'") :
+		dependencies.setdefault(packageId, []).append((uid, parseVersion(fromVersion), parseVersion(toVersion)))
+	for (packageId, path, uid, version) in index.db.execute("SELECT id, path, uid, version FROM packages WHERE error IS NULL") :
+		graph.addPackage(path, uid, parseVersion(version), dependencies.get(packageId, []))
+	return graph
+
+def loadPackageDependencies(index, key) :
+	"""Returns the dependency graph of the indexed package at path key and of
+	the packages it may depend on, directly or not, looking up the packages
+	of each dependency UID instead of loading the whole index. Returns None
+	if the package is not in the index."""
+	row = index.db.execute("SELECT id, path, uid, version FROM packages WHERE path = ? AND error IS NULL", (key,)).fetchone()
+	if row is None :
+		return None
+	graph = SISDependencyGraph()
+	pending = [row]
+	loadedUids = set()
+	while pending :
+		(packageId, path, uid, version) = pending.pop()
+		dependencies = [(dependencyUid, parseVersion(fromVersion), parseVersion(toVersion))
+			for (dependencyUid, fromVersion, toVersion) in index.db.execute("SELECT uid, from_version, to_version "
+				"FROM dependencies WHERE package_id = ? AND kind = 'package'", (packageId,))]
+		graph.addPackage(path, uid, parseVersion(version), dependencies)
+		for (dependencyUid, fromVersion, toVersion) in dependencies :
+			if dependencyUid not in loadedUids :
+				loadedUids.add(dependencyUid)
+				pending.extend(index.db.execute("SELECT id, path, uid, version FROM packages "
+					"WHERE uid = ? AND error IS NULL", (dependencyUid,)).fetchall())
+	return graph
@@ -0,0 +1,183 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import sisinfo, sispackage, sisfiles, sisreader
+
+def _dependencyKey(dependency) :
+	return (dependency.uid, dependency.fromVersion, dependency.toVersion)
+
+def _dependencyStr(dependency) :
+	buf = hex(dependency.uid) + " " + sispackage.versionStr(dependency.fromVersion, "-") + " - " + \
+		sispackage.versionStr(dependency.toVersion, "-")
+	if dependency.names :
+		buf += " " + dependency.names[0]
+	return buf
+
+def _parse(filename) :
+	sisInfo = sisinfo.SISInfo()
+	sisInfo.parse(filename, metadataOnly = True)
+	return (sisInfo, sispackage.SISPackage(sisInfo))
+
+def _payloads(filename, fileIndices) :
+	"""Returns the payload streams of the files of the SIS file, by file
+	index. Only the files read from the streams are decompressed."""
+	result = {}
+	for entry in sisfiles.iterFiles(filename, cache = None) :
+		if entry.fileIndex in fileIndices and entry.payload is not None :
+			result.setdefault(entry.fileIndex, entry.payload)
+	return result
+
+def _sameContents(old, new) :
+	if old is None or new is None :
+		return old is new
+	try :
+		while True :
+			oldBuf = old.read(sisreader.PayloadChunkSize)
+			newBuf = new.read(sisreader.PayloadChunkSize)
+			if oldBuf != newBuf :
+				return False
+			if not oldBuf :
+				return True
+	finally :
+		old.close()
+		new.close()
+
+class SISDiff :
+	"""Differences between two versions of a package. The file contents are
+	compared by the SHA-1 hashes and the uncompressed lengths of the file
+	descriptions. Only the files for which those are not enough to tell
+	whether the file changed are read and their contents compared."""
+	def __init__(self, oldFilename, newFilename) :
+		(oldInfo, self.oldPackage) = _parse(oldFilename)
+		(newInfo, self.newPackage) = _parse(newFilename)
+		self.changes = [] # (description, old value, new value)
+		self.addedDependencies = []
+		self.removedDependencies = []
+		self.addedCapabilities = []
+		self.removedCapabilities = []
+		self.addedFiles = []
+		self.removedFiles = []
+		self.changedFiles = [] # (old file, new file, reason)
+		self.capabilityChanges = [] # (old file, new file)
+		self.unchangedFiles = 0
+		self.contentsCompared = False
+
+		for name in ("uid1", "uid2", "uid3") :
+			self._compare("Header " + name.upper(), hex(getattr(oldInfo.fileHeader, name)), hex(getattr(newInfo.fileHeader, name)))
+		old = self.oldPackage
+		new = self.newPackage
+		self._compare("UID", hex(old.uid), hex(new.uid))
+		self._compare("Version", sispackage.versionStr(old.version, "-"), sispackage.versionStr(new.version, "-"))
+		self._compare("Vendor", old.vendor, new.vendor)
+		self._compare("Name", old.name(), new.name())
+		self._compareDependencies(old.targetDevices + old.dependencies, new.targetDevices + new.dependencies)
+		oldCaps = sispackage.capabilityNames(old.capabilities())
+		newCaps = sispackage.capabilityNames(new.capabilities())
+		self.addedCapabilities = [c for c in newCaps if c not in oldCaps]
+		self.removedCapabilities = [c for c in oldCaps if c not in newCaps]
+		self._compareFiles(oldFilename, newFilename)
+
+	def _compare(self, description, old, new) :
+		if old != new :
+			self.changes.append((description, old, new))
+
+	def _compareDependencies(self, old, new) :
+		oldKeys = [_dependencyKey(d) for d in old]
+		newKeys = [_dependencyKey(d) for d in new]
+		self.addedDependencies = [d for d in new if _dependencyKey(d) not in oldKeys]
+		self.removedDependencies = [d for d in old if _dependencyKey(d) not in newKeys]
+
+	def _compareFiles(self, oldFilename, newFilename) :
+		oldFiles = {}
+		for f in self.oldPackage.files :
+			oldFiles.setdefault(sispackage.normalizeTargetPath(f.target), []).append(f)
+		pairs = []
+		for f in self.newPackage.files :
+			candidates = oldFiles.get(sispackage.normalizeTargetPath(f.target))
+			if candidates :
+				pairs.append((candidates.pop(0), f))
+			else :
+				self.addedFiles.append(f)
+		for files in oldFiles.values() :
+			self.removedFiles.extend(files)
+		self.removedFiles.sort(lambda a, b : cmp(a.fileIndex, b.fileIndex))
+
+		inconclusive = []
+		for (old, new) in pairs :
+			if old.capabilities != new.capabilities :
+				self.capabilityChanges.append((old, new))
+			if old.hashDigest is not None and new.hashDigest is not None and old.hashAlgorithm == new.hashAlgorithm :
+				if old.hashDigest != new.hashDigest :
+					self.changedFiles.append((old, new, "hash"))
+				else :
+					self.unchangedFiles += 1
+			elif old.uncompressedLength != new.uncompressedLength :
+				self.changedFiles.append((old, new, "size"))
+			else :
+				inconclusive.append((old, new))
+
+		if inconclusive :
+			self.contentsCompared = True
+			oldPayloads = _payloads(oldFilename, [old.fileIndex for (old, new) in inconclusive])
+			newPayloads = _payloads(newFilename, [new.fileIndex for (old, new) in inconclusive])
+			for (old, new) in inconclusive :
+				if not _sameContents(oldPayloads.get(old.fileIndex), newPayloads.get(new.fileIndex)) :
+					self.changedFiles.append((old, new, "contents"))
+				else :
+					self.unchangedFiles += 1
+
+	def hasChanges(self) :
+		return len(self.changes + self.addedDependencies + self.removedDependencies + self.addedCapabilities + \
+			self.removedCapabilities + self.addedFiles + self.removedFiles + self.changedFiles + self.capabilityChanges) > 0
+
+	def readableStr(self) :
+		lines = []
+		for (description, old, new) in self.changes :
+			lines.append(description + ": " + unicode(old) + " -> " + unicode(new))
+		for d in self.removedDependencies :
+			lines.append("Dependency removed: " + _dependencyStr(d))
+		for d in self.addedDependencies :
+			lines.append("Dependency added: " + _dependencyStr(d))
+		if self.removedCapabilities :
+			lines.append("Capabilities removed: " + " ".join(self.removedCapabilities))
+		if self.addedCapabilities :
+			lines.append("Capabilities added: " + " ".join(self.addedCapabilities))
+		for f in self.removedFiles :
+			lines.append("File removed: " + f.target)
+		for f in self.addedFiles :
+			lines.append("File added: " + f.target + " (" + str(f.uncompressedLength) + " bytes)")
+		for (old, new, reason) in self.changedFiles :
+			lines.append("File changed: " + new.target + " (" + str(old.uncompressedLength) + " -> " + \
+				str(new.uncompressedLength) + " bytes, by " + reason + ")")
+		for (old, new) in self.capabilityChanges :
+			lines.append("File capabilities changed: " + new.target + " [" + " ".join(old.capabilityNames()) + \
+				"] -> [" + " ".join(new.capabilityNames()) + "]")
+		lines.append("Unchanged files: " + str(self.unchangedFiles))
+		return "\n".join(lines)
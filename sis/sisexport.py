@@ -0,0 +1,191 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import numpy
+import siscorpus
+
+# (column name, NumPy type)
+FileColumns = [
+	("file_package_id", numpy.uint32),
+	("file_index", numpy.uint32),
+	("file_operation", numpy.uint32),
+	("file_options", numpy.uint32),
+	("file_compressed_length", numpy.uint64),
+	("file_uncompressed_length", numpy.uint64),
+	("file_capabilities", numpy.uint32),
+	("file_target_offset", numpy.uint64),
+	("file_target_length", numpy.uint32),
+	]
+PackageColumns = [
+	("package_uid", numpy.uint32),
+	("package_name_offset", numpy.uint64),
+	("package_name_length", numpy.uint32),
+	]
+StringHeap = "strings"
+# Number of values collected in a list before they go to a NumPy array
+ChunkRows = 65536
+
+class _ColumnBuilder :
+	"""Collects the values of a column into NumPy arrays of ChunkRows
+	values, so that the 64-bit values are exact on every platform"""
+	def __init__(self, dtype) :
+		self.dtype = dtype
+		self.chunks = []
+		self.pending = []
+		self.rows = 0
+
+	def append(self, value) :
+		self.pending.append(value)
+		self.rows += 1
+		if len(self.pending) >= ChunkRows :
+			self._flush()
+
+	def _flush(self) :
+		if self.pending :
+			self.chunks.append(numpy.array(self.pending, dtype=self.dtype))
+			self.pending = []
+
+	def array(self) :
+		self._flush()
+		if not self.chunks :
+			return numpy.zeros(0, dtype=self.dtype)
+		return numpy.concatenate(self.chunks)
+
+class SISFileColumns :
+	"""Columns of the file descriptions of a corpus, one row per file, saved
+	as .npy files that numpy.load can memory map. Row i of the file columns
+	belongs to the package in row file_package_id[i] of the package columns.
+	The install paths and package names are UTF-8 strings in the shared
+	string heap, found by their offset and length. Equal strings are stored
+	once."""
+	def __init__(self) :
+		self.columns = {}
+		self._rows = {}
+		for (name, dtype) in FileColumns + PackageColumns :
+			self._rows[name] = _ColumnBuilder(dtype)
+		self._heap = []
+		self._heapSize = 0
+		self._strings = {}
+
+	def _addString(self, string) :
+		data = string
+		if isinstance(data, unicode) :
+			data = data.encode("utf-8")
+		offset = self._strings.get(data)
+		if offset is None :
+			offset = self._heapSize
+			self._strings[data] = offset
+			self._heap.append(data)
+			self._heapSize += len(data)
+		return (offset, len(data))
+
+	def addPackage(self, name, uid) :
+		"""Adds a package row and returns its package id"""
+		packageId = self._rows["package_uid"].rows
+		(offset, length) = self._addString(name)
+		self._rows["package_uid"].append(uid)
+		self._rows["package_name_offset"].append(offset)
+		self._rows["package_name_length"].append(length)
+		return packageId
+
+	def addFile(self, packageId, fileIndex, operation, options, compressedLength, uncompressedLength, capabilities, target) :
+		(offset, length) = self._addString(target)
+		for (name, value) in (("file_package_id", packageId), ("file_index", fileIndex), ("file_operation", operation),
+				("file_options", options), ("file_compressed_length", compressedLength),
+				("file_uncompressed_length", uncompressedLength), ("file_capabilities", capabilities),
+				("file_target_offset", offset), ("file_target_length", length)) :
+			self._rows[name].append(value)
+
+	def addSISPackage(self, name, package) :
+		packageId = self.addPackage(name, package.uid)
+		for f in package.files :
+			self.addFile(packageId, f.fileIndex, f.operation, f.operationOptions, f.compressedLength,
+				f.uncompressedLength, f.capabilities, f.target)
+
+	def freeze(self) :
+		"""Converts the collected rows to NumPy arrays"""
+		for (name, dtype) in FileColumns + PackageColumns :
+			self.columns[name] = self._rows[name].array()
+		self.columns[StringHeap] = numpy.frombuffer("".join(self._heap), dtype=numpy.uint8).copy()
+
+	def save(self, directory) :
+		"""Writes each column to directory/NAME.npy"""
+		if not self.columns :
+			self.freeze()
+		if not os.path.isdir(directory) :
+			os.makedirs(directory)
+		for (name, column) in self.columns.items() :
+			numpy.save(os.path.join(directory, name + ".npy"), column)
+
+	def rows(self) :
+		return len(self.columns["file_package_id"])
+
+	def _string(self, offset, length) :
+		return self.columns[StringHeap][int(offset):int(offset) + int(length)].tostring().decode("utf-8")
+
+	def target(self, row) :
+		return self._string(self.columns["file_target_offset"][row], self.columns["file_target_length"][row])
+
+	def packageName(self, packageId) :
+		return self._string(self.columns["package_name_offset"][packageId], self.columns["package_name_length"][packageId])
+
+def loadFileColumns(directory, mmapMode = "r") :
+	"""Returns the SISFileColumns saved in directory, memory mapped unless
+	mmapMode is None"""
+	result = SISFileColumns()
+	for (name, dtype) in FileColumns + PackageColumns + [(StringHeap, numpy.uint8)] :
+		result.columns[name] = numpy.load(os.path.join(directory, name + ".npy"), mmap_mode = mmapMode)
+	return result
+
+def collectFileColumns(path) :
+	"""Parses the SIS files under path, including those in zip and tar
+	archives, and returns the columns of their file descriptions and the
+	list of (name, error) of the files that could not be parsed"""
+	columns = SISFileColumns()
+	failed = []
+	for (source, package) in siscorpus.parseSources(path, failed) :
+		columns.addSISPackage(source.name, package)
+	columns.freeze()
+	return (columns, failed)
+
+def indexFileColumns(index) :
+	"""Returns the columns of the files of the packages in a
+	sisindex.SISIndex without parsing them again"""
+	columns = SISFileColumns()
+	packageIds = {}
+	for (packageId, path, uid) in index.db.execute("SELECT id, path, uid FROM packages WHERE error IS NULL ORDER BY id") :
+		packageIds[packageId] = columns.addPackage(path, uid or 0)
+	for row in index.db.execute("SELECT package_id, file_index, operation, operation_options, compressed_length, "
+			"uncompressed_length, capabilities, target FROM files ORDER BY package_id, rowid") :
+		if row[0] in packageIds :
+			columns.addFile(packageIds[row[0]], *row[1:])
+	columns.freeze()
+	return columns
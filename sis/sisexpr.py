@@ -0,0 +1,218 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import operator
+import sisfields, sispackage
+
+LanguageVariable = 0x1000
+
+VariableNames = {
+	0 : "Manufacturer",
+	1 : "ManufacturerHardwareRev",
+	2 : "ManufacturerSoftwareRev",
+	3 : "ManufacturerSoftwareBuild",
+	4 : "Model",
+	5 : "MachineUID",
+	LanguageVariable : "Language",
+	}
+
+# Application property key that is answered with whether the package
+# is installed, i.e. the package(uid) condition
+PackageInstalledProperty = -1
+
+OperatorNames = {
+	sisfields.EBinOpEqual : "=",
+	sisfields.EBinOpNotEqual : "<>",
+	sisfields.EBinOpGreaterThan : ">",
+	sisfields.EBinOpLessThan : "<",
+	sisfields.EBinOpGreaterThanOrEqual : ">=",
+	sisfields.EBinOpLessThanOrEqual : "<=",
+	sisfields.ELogOpAnd : "AND",
+	sisfields.ELogOpOr : "OR",
+	}
+
+BinaryOperators = {
+	sisfields.EBinOpEqual : operator.eq,
+	sisfields.EBinOpNotEqual : operator.ne,
+	sisfields.EBinOpGreaterThan : operator.gt,
+	sisfields.EBinOpLessThan : operator.lt,
+	sisfields.EBinOpGreaterThanOrEqual : operator.ge,
+	sisfields.EBinOpLessThanOrEqual : operator.le,
+	sisfields.ELogOpAnd : lambda a, b : a and b,
+	sisfields.ELogOpOr : lambda a, b : a or b,
+	}
+
+class SISDeviceProfile :
+	"""Device configuration that the install conditions are evaluated
+	against. options are the numbers of the selected install options,
+	variables maps HAL attribute numbers to values, packages maps the UIDs
+	of the installed packages to their versions, appProperties maps
+	(UID, key) pairs to values and files is the set of existing files."""
+	def __init__(self, language = 1, options = (), variables = None, packages = None, appProperties = None, files = ()) :
+		self.language = language
+		self.options = set(options)
+		self.variables = variables or {}
+		self.packages = packages or {}
+		self.appProperties = appProperties or {}
+		self.files = set([sispackage.normalizeTargetPath(f) for f in files])
+
+	def variable(self, variable) :
+		if variable == LanguageVariable :
+			return self.language
+		return self.variables.get(variable, 0)
+
+	def appProperty(self, uid, key) :
+		uid &= 0xffffffff
+		if key == PackageInstalledProperty :
+			return int(uid in self.packages)
+		return self.appProperties.get((uid, key), 0)
+
+def _constant(value) :
+	return lambda profiles : [value] * len(profiles)
+
+def compileExpression(field) :
+	"""Compiles the expression field to a function that takes a list of
+	SISDeviceProfiles and returns the list of the expression values for them"""
+	op = field.operator
+	if op == sisfields.EPrimTypeNumber :
+		return _constant(field.integerValue)
+	if op == sisfields.EPrimTypeString :
+		return _constant(field.subFields[0].readableStr())
+	if op == sisfields.EPrimTypeOption :
+		option = field.integerValue
+		return lambda profiles : [int(option in p.options) for p in profiles]
+	if op == sisfields.EPrimTypeVariable :
+		variable = field.integerValue
+		return lambda profiles : [p.variable(variable) for p in profiles]
+	if op == sisfields.EFuncExists :
+		path = sispackage.normalizeTargetPath(field.subFields[0].readableStr())
+		return lambda profiles : [int(path in p.files) for p in profiles]
+	if op == sisfields.EUnaryOpNot :
+		operand = compileExpression(field.subFields[0])
+		return lambda profiles : [int(not v) for v in operand(profiles)]
+	if op in BinaryOperators :
+		function = BinaryOperators[op]
+		left = compileExpression(field.subFields[0])
+		right = compileExpression(field.subFields[1])
+		return lambda profiles : [int(bool(function(a, b))) for (a, b) in zip(left(profiles), right(profiles))]
+	if op == sisfields.EFuncAppProperties :
+		uid = compileExpression(field.subFields[0])
+		key = compileExpression(field.subFields[1])
+		return lambda profiles : [p.appProperty(u, k) for (p, u, k) in zip(profiles, uid(profiles), key(profiles))]
+	if op == sisfields.EFuncDevProperties :
+		# Device properties are not supported by the installer either
+		return _constant(0)
+	raise Exception("Unknown expression operator: " + str(op))
+
+def evaluateExpression(field, profile) :
+	return compileExpression(field)([profile])[0]
+
+def describeExpression(field) :
+	"""Returns the expression in the package file syntax"""
+	op = field.operator
+	if op == sisfields.EPrimTypeNumber :
+		return str(field.integerValue)
+	if op == sisfields.EPrimTypeString :
+		return '"' + field.subFields[0].readableStr() + '"'
+	if op == sisfields.EPrimTypeOption :
+		return "option" + str(field.integerValue)
+	if op == sisfields.EPrimTypeVariable :
+		return VariableNames.get(field.integerValue, hex(field.integerValue))
+	if op == sisfields.EFuncExists :
+		return 'exists("' + field.subFields[0].readableStr() + '")'
+	if op == sisfields.EUnaryOpNot :
+		return "NOT (" + describeExpression(field.subFields[0]) + ")"
+	if op in OperatorNames :
+		return "(" + describeExpression(field.subFields[0]) + " " + OperatorNames[op] + " " + describeExpression(field.subFields[1]) + ")"
+	if op == sisfields.EFuncAppProperties :
+		return "appprop(" + describeExpression(field.subFields[0]) + ", " + describeExpression(field.subFields[1]) + ")"
+	if op == sisfields.EFuncDevProperties :
+		return "devprop(" + describeExpression(field.subFields[0]) + ", " + describeExpression(field.subFields[1]) + ")"
+	return "unknown(" + str(op) + ")"
+
+class SISInstallPlanBlock :
+	def __init__(self, number) :
+		self.number = number
+		self.files = []
+		self.conditions = [] # list of if chains, each a list of (condition, block)
+
+class SISInstallPlan :
+	"""The install block of a package with the conditions compiled. The
+	blocks are numbered like in sispackage.SISPackage: block 0 holds the
+	unconditional files and each if and else if block gets the next number
+	in the order they appear in the package."""
+	def __init__(self, package) :
+		self.root = SISInstallPlanBlock(0)
+		self.blocks = [self.root]
+		self.descriptions = {0 : ""}
+		if package.installBlock :
+			self._compileBlock(self.root, package.installBlock)
+
+	def _newBlock(self, expression) :
+		block = SISInstallPlanBlock(len(self.blocks))
+		self.blocks.append(block)
+		self.descriptions[block.number] = describeExpression(expression)
+		return block
+
+	def _compileBlock(self, block, installBlock) :
+		for f in installBlock.subFields[0].subFields :
+			block.files.append(sispackage.SISPackageFile(f, block.number))
+		for ifField in installBlock.subFields[2].subFields :
+			chain = []
+			subBlock = self._newBlock(ifField.subFields[0])
+			chain.append((compileExpression(ifField.subFields[0]), subBlock))
+			self._compileBlock(subBlock, ifField.subFields[1])
+			for elseIfField in ifField.subFields[2].subFields :
+				subBlock = self._newBlock(elseIfField.subFields[0])
+				chain.append((compileExpression(elseIfField.subFields[0]), subBlock))
+				self._compileBlock(subBlock, elseIfField.subFields[1])
+			block.conditions.append(chain)
+
+	def resolve(self, profiles) :
+		"""Returns for each profile the list of files (sispackage.SISPackageFile)
+		installed with it. Each condition is evaluated once for all the
+		profiles reaching it."""
+		result = [[] for p in profiles]
+		self._resolveBlock(self.root, range(len(profiles)), profiles, result)
+		return result
+
+	def _resolveBlock(self, block, selected, profiles, result) :
+		for i in selected :
+			result[i].extend(block.files)
+		for chain in block.conditions :
+			remaining = selected
+			for (condition, subBlock) in chain :
+				if not remaining :
+					break
+				values = condition([profiles[i] for i in remaining])
+				taken = [i for (i, v) in zip(remaining, values) if v]
+				remaining = [i for (i, v) in zip(remaining, values) if not v]
+				if taken :
+					self._resolveBlock(subBlock, taken, profiles, result)
@@ -0,0 +1,90 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+
+ChunkSize = 1 << 20
+
+class SISExtractStatistics :
+	def __init__(self) :
+		self.files = 0
+		self.bytesWritten = 0
+		self.copied = 0
+
+	def readableStr(self) :
+		return "files: " + str(self.files) + ", bytes written: " + str(self.bytesWritten) + \
+			", copied from the SIS file: " + str(self.copied)
+
+def _writeAll(fd, buf) :
+	while buf :
+		n = os.write(fd, buf)
+		buf = buf[n:]
+
+def copyRange(srcFd, dstFd, offset, length, stats = None) :
+	"""Copies length bytes from offset of srcFd to the start of dstFd in
+	chunks of ChunkSize. Python 2 has no os.copy_file_range or os.sendfile,
+	so the chunked copy is the only way."""
+	os.lseek(srcFd, offset, os.SEEK_SET)
+	copied = 0
+	while copied < length :
+		buf = os.read(srcFd, min(ChunkSize, length - copied))
+		if not buf :
+			raise IOError("SIS file truncated, copied " + str(copied) + " of " + str(length) + " bytes")
+		_writeAll(dstFd, buf)
+		copied += len(buf)
+	if stats :
+		stats.copied += 1
+	return copied
+
+class SISExtractor :
+	"""Writes the file contents of a SIS file parsed with skipStoredData.
+	Files stored without compression are copied directly from the SIS file,
+	the others are written from the decompressed data."""
+	def __init__(self, filename) :
+		self.source = os.open(filename, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+		self.stats = SISExtractStatistics()
+
+	def extract(self, compressedField, filename) :
+		fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0666)
+		try :
+			if compressedField.data is None and compressedField.dataOffset is not None :
+				length = compressedField.length - 4 - 8
+				copyRange(self.source, fd, compressedField.dataOffset, length, self.stats)
+			else :
+				data = compressedField.data or ""
+				_writeAll(fd, data)
+				length = len(data)
+		finally :
+			os.close(fd)
+		self.stats.files += 1
+		self.stats.bytesWritten += length
+
+	def close(self) :
+		os.close(self.source)
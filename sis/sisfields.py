@@ -29,7 +29,6 @@ THE POSSIBILITY OF SUCH DAMAGE.
 """
 
 import sisreader 
-import zlib
 import sys
 
 class SISFileHeader :
@@ -50,6 +49,7 @@ class SISField :
 		if length & 0x80000000 > 0 :
 			length = length << 32
 			length |= fileReader.readBytesAsUint(4)
+		fileReader.context.checkFieldLength(length, fileReader.remaining())
 		return length
 		
 	def findField(self, fieldType, startIndex = 0) :
@@ -77,7 +77,11 @@ class SISUnsupportedField(SISField) :
 		
 	def initFromFile(self, fileReader) :
 		self.length = self.readFieldLength(fileReader)
-		fileReader.readPlainBytes(self.length)
+		fileReader.skipBytes(self.length)
+
+# Field whose type is in the skipFieldTypes of the reader, its contents are skipped
+class SISSkippedField(SISUnsupportedField) :
+	pass
 
 class SISStringField(SISField) :
 	def __init__(self) :
@@ -107,7 +111,9 @@ class SISArrayField(SISField) :
 		while l > 0 :
 			field = SISFieldTypes[type]()
 			field.type = type
+			fileReader.context.enterField()
 			field.initFromFile(fileReader)
+			fileReader.context.leaveField()
 			self.subFields.append(field)
 			
 			l -= field.length + 4 # field length + the length field
@@ -120,16 +126,32 @@ class SISCompressedField(SISField) :
 		self.algorithm = None
 		self.uncompressedDataSize = None
 		self.data = None
+		self.dataOffset = None
 		
 	def initFromFile(self, fileReader) :
 		self.length = self.readFieldLength(fileReader)
 		self.algorithm = fileReader.readBytesAsUint(4)
 		self.uncompressedDataSize = fileReader.readBytesAsUint(8)
+		self.dataOffset = fileReader.streamOffset()
+		if fileReader.readingFileData and fileReader.payloadHandler :
+			raw = fileReader.readChunks(self.length - 4 - 8)
+			chunks = raw
+			if self.algorithm == 1 :
+				chunks = fileReader.context.decompressChunks(raw, self.length - 4 - 8, self.uncompressedDataSize)
+			fileReader.payloadHandler(self, chunks)
+			for chunk in raw :
+				pass # the contents the handler did not read
+			return
+		if fileReader.readingFileData and (fileReader.skipFileData or (self.algorithm == 0 and fileReader.skipStoredData)) :
+			# The file contents are left in the file, to be read from
+			# dataOffset if the stream has offsets
+			fileReader.skipBytes(self.length - 4 - 8)
+			return
 		data = fileReader.readPlainBytes(self.length - 4 - 8)
 		if self.algorithm == 0 :
 			self.data = data
 		elif self.algorithm == 1 :
-			self.data = zlib.decompress(data)
+			self.data = fileReader.context.decompress(data, self.uncompressedDataSize)
 			
 class SISVersionField(SISField) :
 	def __init__(self) :
@@ -154,9 +176,10 @@ class SISVersionRangeField(SISField) :
 		
 	def initFromFile(self, fileReader) :
 		self.length = self.readFieldLength(fileReader)
+		start = fileReader.bytesRead
 		fieldParser = sisreader.SISFieldParser()
 		self.fromVersion = fieldParser.parseField(fileReader)
-		if self.length - fieldParser.lastReadBytes > 0  :
+		if self.length - (fileReader.bytesRead - start) > 0 :
 			self.toVersion = fieldParser.parseField(fileReader)
 	
 class SISDateField(SISField) :
@@ -230,6 +253,7 @@ class SISLanguageField(SISField) :
 class SISContentsField(SISField) :
 	def __init__(self) :
 		SISField.__init__(self)
+		self.compressedController = None
 		
 	def initFromFile(self, fileReader) :
 		self.length = self.readFieldLength(fileReader)
@@ -237,7 +261,8 @@ class SISContentsField(SISField) :
 		field = fieldParser.parseField(fileReader)
 		while field :
 			if field.type == 3 : # compressed<conroller>
-				bufferReader = sisreader.SISBufferReader(field.data)
+				self.compressedController = field
+				bufferReader = sisreader.SISBufferReader(field.data, fileReader)
 				field = fieldParser.parseField(bufferReader)
 			self.subFields.append(field)
 			field = fieldParser.parseField(fileReader)
@@ -249,7 +274,7 @@ class SISControllerField(SISField) :
 	def initFromFile(self, fileReader) :
 		self.length = self.readFieldLength(fileReader)
 		fieldParser = sisreader.SISFieldParser()
-		bufferReader = sisreader.SISBufferReader(fileReader.readPlainBytes(self.length))
+		bufferReader = sisreader.SISBufferReader(fileReader.readPlainBytes(self.length), fileReader)
 		field = fieldParser.parseField(bufferReader)
 		while field :
 			self.subFields.append(field)
@@ -301,8 +326,6 @@ class SISPrerequisitiesField(SISField) :
 		self.subFields.append(fieldParser.parseField(fileReader)) # target devices
 		self.subFields.append(fieldParser.parseField(fileReader)) # dependencies
 		
-import pdb
-        
 class SISDependencyField(SISField) :
 	def __init__(self) :
 		SISField.__init__(self)
@@ -448,11 +471,11 @@ class SISExpressionField(SISField) :
 		self.operator = fileReader.readBytesAsUint(4)
 		self.integerValue = fileReader.readBytesAsInt(4)
 		
-		if self.operator == 10 or self.operator == 13 :
+		if self.operator in StringValueOperators :
 			self.subFields.append(fieldParser.parseField(fileReader))
-		if self.operator == 1 or self.operator == 2 or self.operator == 3 or self.operator == 4 or self.operator == 5 or self.operator == 6 or self.operator == 7 or self.operator == 8 or self.operator == 11 or self.operator == 12 :
+		if self.operator in LeftExpressionOperators :
 			self.subFields.append(fieldParser.parseField(fileReader))
-		if not (self.operator == 13 or self.operator == 14 or self.operator == 15 or self.operator == 16 or self.operator == 10) :
+		if self.operator not in NoRightExpressionOperators :
 			self.subFields.append(fieldParser.parseField(fileReader))
 		
 class SISDataField(SISField) :
@@ -470,6 +493,8 @@ class SISDataUnitField(SISField) :
 		
 	def initFromFile(self, fileReader) :
 		self.length = self.readFieldLength(fileReader)
+		fileReader.dataUnitIndex += 1
+		fileReader.fileDataIndex = -1
 		fieldParser = sisreader.SISFieldParser()
 		self.subFields.append(fieldParser.parseField(fileReader)) # file data
 	
@@ -480,7 +505,12 @@ class SISFileDataField(SISField) :
 	def initFromFile(self, fileReader) :
 		self.length = self.readFieldLength(fileReader)
 		fieldParser = sisreader.SISFieldParser()
-		self.subFields.append(fieldParser.parseField(fileReader)) # raw file data
+		fileReader.fileDataIndex += 1
+		fileReader.readingFileData = True
+		try :
+			self.subFields.append(fieldParser.parseField(fileReader)) # raw file data
+		finally :
+			fileReader.readingFileData = False
 	
 class SISSupportedOptionField(SISField) :
 	def __init__(self) :
@@ -573,6 +603,7 @@ class SISCapabilitiesField(SISField) :
 	def readableStr(self) :
 		return " ".join(self.readableCaps)
 	
+# Field type : field class, read only and shared by all the parses
 SISFieldTypes = { 
 	1 : SISStringField,
 	2 : SISArrayField,
@@ -704,6 +735,28 @@ FieldNames = {
  CapabilitiesField : "CapabilitiesField"
 }
 	 
+[EBinOpEqual,
+ EBinOpNotEqual,
+ EBinOpGreaterThan,
+ EBinOpLessThan,
+ EBinOpGreaterThanOrEqual,
+ EBinOpLessThanOrEqual,
+ ELogOpAnd,
+ ELogOpOr,
+ EUnaryOpNot,
+ EFuncExists,
+ EFuncAppProperties,
+ EFuncDevProperties,
+ EPrimTypeString,
+ EPrimTypeOption,
+ EPrimTypeVariable,
+ EPrimTypeNumber] = range(1, 17)
+
+StringValueOperators = (EFuncExists, EPrimTypeString)
+LeftExpressionOperators = (EBinOpEqual, EBinOpNotEqual, EBinOpGreaterThan, EBinOpLessThan, EBinOpGreaterThanOrEqual, 
+	EBinOpLessThanOrEqual, ELogOpAnd, ELogOpOr, EFuncAppProperties, EFuncDevProperties)
+NoRightExpressionOperators = (EFuncExists, EPrimTypeString, EPrimTypeOption, EPrimTypeVariable, EPrimTypeNumber)
+
 CapabilityNames = {
 	0 : "TCB",
 	1 : "CommDD",
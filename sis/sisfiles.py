@@ -0,0 +1,168 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import tempfile
+from cStringIO import StringIO
+import sisinfo, sispackage, sisreader, siscache
+
+DefaultSpillSize = 16 * 1024 * 1024
+DefaultCacheSize = 32 * 1024 * 1024
+
+class SISPayloadCache(siscache.SISLRUCache) :
+	"""LRU cache of decompressed file contents bounded by their total size"""
+	def __init__(self, maxSize = DefaultCacheSize) :
+		siscache.SISLRUCache.__init__(self, maxSize)
+
+	def put(self, key, data) :
+		if len(data) <= self.maxSize :
+			siscache.SISLRUCache.put(self, key, data, len(data))
+
+DefaultPayloadCache = SISPayloadCache()
+
+def _readChunks(fin, length) :
+	while length > 0 :
+		buf = fin.read(min(length, sisreader.PayloadChunkSize))
+		if not buf :
+			raise IOError("Unexpected end of SIS file")
+		length -= len(buf)
+		yield buf
+
+class SISPayloadStream :
+	"""File like object reading the contents of one file of a SIS file. The
+	SIS file is opened on the first read. Stored files are read directly
+	from the SIS file. Compressed files are decompressed on the first read,
+	in memory up to spillSize bytes and to a temporary file beyond that,
+	and the decompressed contents kept in memory go to the cache."""
+	def __init__(self, filename, key, compressedField, spillSize = DefaultSpillSize, cache = None, limits = None) :
+		self.filename = filename
+		self.key = key
+		self.algorithm = compressedField.algorithm
+		self.offset = compressedField.dataOffset
+		self.length = compressedField.length - 4 - 8
+		self.uncompressedSize = compressedField.uncompressedDataSize
+		self.spillSize = spillSize
+		self.cache = cache
+		self.limits = limits
+		self.stream = None
+		self.remaining = None
+		self.spilled = False
+
+	def _open(self) :
+		if self.cache and self.algorithm != 0 :
+			data = self.cache.get(self.key)
+			if data is not None :
+				self.stream = StringIO(data)
+				return
+		fin = open(self.filename, "rb")
+		fin.seek(self.offset)
+		if self.algorithm == 0 :
+			self.stream = fin
+			self.remaining = self.length
+			return
+		try :
+			context = sisreader.SISParseContext(self.limits)
+			buffers = []
+			size = 0
+			for chunk in context.decompressChunks(_readChunks(fin, self.length), self.length, self.uncompressedSize) :
+				if not self.spilled and size + len(chunk) > self.spillSize :
+					self.stream = tempfile.TemporaryFile()
+					self.stream.write("".join(buffers))
+					buffers = None
+					self.spilled = True
+				if self.spilled :
+					self.stream.write(chunk)
+				else :
+					buffers.append(chunk)
+				size += len(chunk)
+		finally :
+			fin.close()
+		if self.spilled :
+			self.stream.seek(0)
+		else :
+			data = "".join(buffers)
+			if self.cache :
+				self.cache.put(self.key, data)
+			self.stream = StringIO(data)
+
+	def read(self, size = -1) :
+		if self.stream is None :
+			self._open()
+		if self.remaining is not None :
+			if size < 0 or size > self.remaining :
+				size = self.remaining
+			buf = self.stream.read(size)
+			self.remaining -= len(buf)
+			return buf
+		return self.stream.read(size)
+
+	def close(self) :
+		if self.stream is not None :
+			self.stream.close()
+			self.stream = None
+
+class SISFileEntry :
+	"""A file of a SIS package: its description and its contents as a
+	SISPayloadStream in payload"""
+	def __init__(self, packageFile, payload) :
+		self.target = packageFile.target
+		self.mimeType = packageFile.mimeType
+		self.capabilities = packageFile.capabilities
+		self.hashAlgorithm = packageFile.hashAlgorithm
+		self.hashDigest = packageFile.hashDigest
+		self.operation = packageFile.operation
+		self.compressedLength = packageFile.compressedLength
+		self.uncompressedLength = packageFile.uncompressedLength
+		self.fileIndex = packageFile.fileIndex
+		self.block = packageFile.block
+		self.payload = payload
+
+	def capabilityNames(self) :
+		return sispackage.capabilityNames(self.capabilities)
+
+def iterFiles(filename, spillSize = DefaultSpillSize, cache = DefaultPayloadCache, limits = None) :
+	"""Yields a SISFileEntry for each file of the SIS file in the order of
+	the file descriptions. The SIS file is parsed without reading the file
+	contents, they are read only through the payload streams."""
+	sisInfo = sisinfo.SISInfo()
+	sisInfo.parse(filename, limits = limits, skipFileData = True)
+	package = sispackage.SISPackage(sisInfo)
+	filename = os.path.abspath(filename)
+	st = os.stat(filename)
+	fileDatas = []
+	if package.dataIndex < len(package.fileDatas) :
+		fileDatas = package.fileDatas[package.dataIndex]
+	for f in package.files :
+		payload = None
+		if f.fileIndex < len(fileDatas) :
+			compressed = fileDatas[f.fileIndex].subFields[0]
+			key = (filename, st.st_size, st.st_mtime, compressed.dataOffset)
+			payload = SISPayloadStream(filename, key, compressed, spillSize, cache, limits)
+		yield SISFileEntry(f, payload)
@@ -0,0 +1,131 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import sispackage, siscorpus, sisexpr
+
+[EOpInstall, EOpRun, EOpText, EOpNull] = [1, 2, 4, 8]
+
+# Operations whose files are installed on the device
+InstalledOperations = (EOpInstall, EOpRun)
+
+def targetDrive(target) :
+	"""Returns the drive letter of the install path in lower case, "!" for
+	the drive selected by the user or "" if the path has no drive"""
+	if len(target) >= 2 and target[1] == ":" :
+		return target[0].lower()
+	return ""
+
+def _addSize(sizes, key, size) :
+	sizes[key] = sizes.get(key, 0) + size
+
+class SISFootprint :
+	"""Installed size of a package, or the sum over a corpus, computed from
+	the file descriptions of the controller only.
+
+	installedSize and compressedSize are the totals of all the installed
+	files regardless of the install conditions. byDrive and byBlock split
+	the installed size by the target drive and by the conditional block
+	(0 being the unconditional files). byLanguage holds the size installed
+	with each supported language, resolving the install conditions."""
+	def __init__(self) :
+		self.packages = 0
+		self.files = 0
+		self.installedSize = 0
+		self.compressedSize = 0
+		self.byDrive = {}
+		self.byLanguage = {}
+		self.byBlock = {}
+		self.blockDescriptions = {}
+
+	def addPackage(self, package) :
+		self.packages += 1
+		plan = sisexpr.SISInstallPlan(package)
+		self.blockDescriptions = plan.descriptions
+		for f in package.files :
+			if f.operation not in InstalledOperations :
+				continue
+			self.files += 1
+			self.installedSize += f.uncompressedLength
+			self.compressedSize += f.compressedLength
+			_addSize(self.byDrive, targetDrive(f.target), f.uncompressedLength)
+			_addSize(self.byBlock, f.block, f.uncompressedLength)
+		languages = package.languages or [1]
+		profiles = [sisexpr.SISDeviceProfile(language=l) for l in languages]
+		for (language, files) in zip(languages, plan.resolve(profiles)) :
+			size = 0
+			for f in files :
+				if f.operation in InstalledOperations :
+					size += f.uncompressedLength
+			_addSize(self.byLanguage, language, size)
+
+	def add(self, other) :
+		"""Adds the footprint of another package or corpus. The conditional
+		blocks are specific to a package, so the blocks are not summed."""
+		self.packages += other.packages
+		self.files += other.files
+		self.installedSize += other.installedSize
+		self.compressedSize += other.compressedSize
+		for (drive, size) in other.byDrive.items() :
+			_addSize(self.byDrive, drive, size)
+		for (language, size) in other.byLanguage.items() :
+			_addSize(self.byLanguage, language, size)
+
+	def readableStr(self) :
+		buf = "Files: " + str(self.files) + ", installed size: " + str(self.installedSize) + \
+			", compressed size: " + str(self.compressedSize)
+		for drive in sorted(self.byDrive.keys()) :
+			buf += "\n   Drive " + (drive or "none") + ": " + str(self.byDrive[drive])
+		for language in sorted(self.byLanguage.keys()) :
+			buf += "\n   Language " + str(language) + ": " + str(self.byLanguage[language])
+		for block in sorted(self.byBlock.keys()) :
+			if block != 0 :
+				buf += "\n   Block " + str(block) + " " + self.blockDescriptions.get(block, "") + ": " + str(self.byBlock[block])
+		return buf
+
+def packageFootprint(filename) :
+	return sourceFootprint(siscorpus.SISFileSource(filename))
+
+def sourceFootprint(source) :
+	footprint = SISFootprint()
+	footprint.addPackage(sispackage.SISPackage(siscorpus.parseSource(source, metadataOnly = True)))
+	return footprint
+
+def corpusFootprint(path, handler = None) :
+	"""Returns the sum of the footprints of the SIS files under path,
+	including those in zip and tar archives, and the list of (name, error)
+	of the files that could not be parsed. If given, handler is called with
+	the name and footprint of each package."""
+	total = SISFootprint()
+	failed = []
+	for (source, footprint) in siscorpus.parseSources(path, failed, sourceFootprint) :
+		if handler :
+			handler(source.name, footprint)
+		total.add(footprint)
+	return (total, failed)
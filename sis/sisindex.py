@@ -0,0 +1,330 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import sqlite3
+import hashlib
+import binascii
+import sispackage, siscorpus, sisminhash
+
+Schema = """
+CREATE TABLE IF NOT EXISTS packages (
+	id INTEGER PRIMARY KEY,
+	path TEXT UNIQUE NOT NULL,
+	size INTEGER,
+	mtime REAL,
+	sha1 TEXT,
+	uid INTEGER,
+	version TEXT,
+	vendor TEXT,
+	name TEXT,
+	error TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+	package_id INTEGER NOT NULL,
+	file_index INTEGER,
+	target TEXT,
+	target_key TEXT,
+	mime_type TEXT,
+	operation INTEGER,
+	operation_options INTEGER,
+	compressed_length INTEGER,
+	uncompressed_length INTEGER,
+	capabilities INTEGER,
+	block INTEGER
+);
+CREATE TABLE IF NOT EXISTS capabilities (
+	package_id INTEGER NOT NULL,
+	file_index INTEGER,
+	capability TEXT
+);
+CREATE TABLE IF NOT EXISTS dependencies (
+	package_id INTEGER NOT NULL,
+	kind TEXT,
+	uid INTEGER,
+	from_version TEXT,
+	to_version TEXT,
+	name TEXT
+);
+CREATE TABLE IF NOT EXISTS certificates (
+	package_id INTEGER NOT NULL,
+	chain_index INTEGER,
+	certificate_index INTEGER,
+	sha1 TEXT,
+	length INTEGER
+);
+CREATE TABLE IF NOT EXISTS payload_hashes (
+	package_id INTEGER NOT NULL,
+	file_index INTEGER,
+	algorithm INTEGER,
+	digest TEXT
+);
+CREATE TABLE IF NOT EXISTS signatures (
+	package_id INTEGER PRIMARY KEY,
+	signature BLOB
+);
+CREATE TABLE IF NOT EXISTS signature_bands (
+	package_id INTEGER NOT NULL,
+	band INTEGER,
+	bucket INTEGER
+);
+CREATE INDEX IF NOT EXISTS packages_uid ON packages (uid);
+CREATE INDEX IF NOT EXISTS files_package ON files (package_id);
+CREATE INDEX IF NOT EXISTS files_target_key ON files (target_key);
+CREATE INDEX IF NOT EXISTS capabilities_package ON capabilities (package_id);
+CREATE INDEX IF NOT EXISTS capabilities_capability ON capabilities (capability);
+CREATE INDEX IF NOT EXISTS dependencies_package ON dependencies (package_id);
+CREATE INDEX IF NOT EXISTS dependencies_uid ON dependencies (uid);
+CREATE INDEX IF NOT EXISTS certificates_package ON certificates (package_id);
+CREATE INDEX IF NOT EXISTS certificates_sha1 ON certificates (sha1);
+CREATE INDEX IF NOT EXISTS payload_hashes_package ON payload_hashes (package_id);
+CREATE INDEX IF NOT EXISTS payload_hashes_digest ON payload_hashes (digest);
+CREATE INDEX IF NOT EXISTS signature_bands_package ON signature_bands (package_id);
+CREATE INDEX IF NOT EXISTS signature_bands_bucket ON signature_bands (band, bucket);
+"""
+
+PackageTables = ["files", "capabilities", "dependencies", "certificates", "payload_hashes", "signatures", "signature_bands"]
+
+def parseUidPattern(pattern) :
+	"""Parses a UID like 0x2000xxxx, where x is a wildcard digit, into an
+	inclusive (low, high) range"""
+	pattern = pattern.lower()
+	if pattern.startswith("0x") :
+		pattern = pattern[2:]
+	low = int(pattern.replace("x", "0"), 16)
+	high = int(pattern.replace("x", "f"), 16)
+	return (low, high)
+
+def _parsePackage(source) :
+	return sispackage.SISPackage(siscorpus.parseSource(source, metadataOnly = True))
+
+class SISIndexStatistics :
+	def __init__(self) :
+		self.unchanged = 0
+		self.touched = 0
+		self.parsed = 0
+		self.failed = 0
+		self.removed = 0
+		self.signed = 0
+
+	def readableStr(self) :
+		buf = "parsed: " + str(self.parsed) + ", unchanged: " + str(self.unchanged) + \
+			", touched: " + str(self.touched) + ", failed: " + str(self.failed) + ", removed: " + str(self.removed)
+		if self.signed :
+			buf += ", signatures added: " + str(self.signed)
+		return buf
+
+class SISIndex :
+	"""SQLite index of the packages of a corpus. The index is updated
+	incrementally: a package is parsed again only if its size or
+	modification time changed and its SHA-1 differs from the indexed one.
+	The database is created if it does not exist, unless create is False,
+	in which case a missing database raises IOError."""
+	def __init__(self, dbPath, create = True) :
+		if not create and not os.path.isfile(dbPath) :
+			raise IOError("No such index: " + dbPath)
+		self.db = sqlite3.connect(dbPath)
+		self.db.executescript(Schema)
+		self.minHash = sisminhash.DefaultMinHash
+
+	def close(self) :
+		self.db.close()
+
+	def update(self, path, verifyHashes = False) :
+		stats = SISIndexStatistics()
+		seen = set()
+		for source in siscorpus.findPackageSources(os.path.abspath(path)) :
+			seen.add(source.name)
+			self.updatePackage(source, stats, verifyHashes)
+		prefix = os.path.abspath(path)
+		for (packageId, filename) in self.db.execute("SELECT id, path FROM packages").fetchall() :
+			if filename not in seen and (filename == prefix or filename.startswith(prefix + os.sep)) :
+				self._deletePackage(packageId, True)
+				stats.removed += 1
+		self._addMissingSignatures(stats)
+		self.db.commit()
+		return stats
+
+	def _addMissingSignatures(self, stats) :
+		"""Signs the packages indexed before the signatures were added to
+		the index"""
+		for (packageId, filename) in self.db.execute("SELECT id, path FROM packages WHERE error IS NULL AND "
+				"id NOT IN (SELECT package_id FROM signatures)").fetchall() :
+			try :
+				package = _parsePackage(siscorpus.SISFileSource(filename))
+			except Exception, err :
+				self.db.execute("UPDATE packages SET error = ? WHERE id = ?", (err.__class__.__name__ + ": " + str(err), packageId))
+				stats.failed += 1
+				continue
+			self._insertSignature(packageId, package)
+			stats.signed += 1
+
+	def updatePackage(self, source, stats, verifyHashes = False) :
+		"""Indexes a siscorpus source, or a SIS file given by its name"""
+		if isinstance(source, basestring) :
+			source = siscorpus.SISFileSource(os.path.abspath(source))
+		row = self.db.execute("SELECT id, size, mtime, sha1 FROM packages WHERE path = ?", (source.name,)).fetchone()
+		if row and row[1] == source.size and row[2] == source.mtime and not verifyHashes :
+			stats.unchanged += 1
+			return
+		# The source is hashed while parsed, reading it only once, as
+		# reading a member of a compressed tar archive again decompresses
+		# the archive from its start
+		(sisInfo, sha1, error) = siscorpus.parseSourceDigest(source, metadataOnly = True)
+		if row and sha1 and row[3] == sha1 :
+			self.db.execute("UPDATE packages SET size = ?, mtime = ? WHERE id = ?", (source.size, source.mtime, row[0]))
+			stats.touched += 1
+			return
+		if row :
+			self._deletePackage(row[0], False)
+			packageId = row[0]
+			self.db.execute("UPDATE packages SET size = ?, mtime = ?, sha1 = ?, error = NULL WHERE id = ?",
+				(source.size, source.mtime, sha1, packageId))
+		else :
+			packageId = self.db.execute("INSERT INTO packages (path, size, mtime, sha1) VALUES (?, ?, ?, ?)",
+				(source.name, source.size, source.mtime, sha1)).lastrowid
+		package = None
+		if error is None :
+			try :
+				package = sispackage.SISPackage(sisInfo)
+			except Exception, err :
+				error = err
+		if error is not None :
+			self.db.execute("UPDATE packages SET error = ? WHERE id = ?", (error.__class__.__name__ + ": " + str(error), packageId))
+			stats.failed += 1
+			return
+		self._insertPackage(packageId, package)
+		stats.parsed += 1
+
+	def _deletePackage(self, packageId, deleteRow) :
+		for table in PackageTables :
+			self.db.execute("DELETE FROM " + table + " WHERE package_id = ?", (packageId,))
+		if deleteRow :
+			self.db.execute("DELETE FROM packages WHERE id = ?", (packageId,))
+
+	def _insertPackage(self, packageId, package) :
+		self.db.execute("UPDATE packages SET uid = ?, version = ?, vendor = ?, name = ? WHERE id = ?",
+			(package.uid, sispackage.versionStr(package.version, None), package.vendor, package.name(), packageId))
+		files = []
+		capabilities = []
+		hashes = []
+		for f in package.files :
+			files.append((packageId, f.fileIndex, f.target, sispackage.normalizeTargetPath(f.target), f.mimeType,
+				f.operation, f.operationOptions, f.compressedLength, f.uncompressedLength, f.capabilities, f.block))
+			for name in f.capabilityNames() :
+				capabilities.append((packageId, f.fileIndex, name))
+			if f.hashDigest is not None :
+				hashes.append((packageId, f.fileIndex, f.hashAlgorithm, binascii.hexlify(f.hashDigest)))
+		self.db.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", files)
+		self.db.executemany("INSERT INTO capabilities VALUES (?, ?, ?)", capabilities)
+		self.db.executemany("INSERT INTO payload_hashes VALUES (?, ?, ?, ?)", hashes)
+		dependencies = []
+		for (kind, deps) in (("device", package.targetDevices), ("package", package.dependencies)) :
+			for d in deps :
+				dependencies.append((packageId, kind, d.uid, sispackage.versionStr(d.fromVersion, None),
+					sispackage.versionStr(d.toVersion, None), len(d.names) > 0 and d.names[0] or None))
+		self.db.executemany("INSERT INTO dependencies VALUES (?, ?, ?, ?, ?, ?)", dependencies)
+		certificates = []
+		for i in range(len(package.certificateChains)) :
+			chain = package.certificateChains[i]
+			for j in range(len(chain)) :
+				certificates.append((packageId, i, j, hashlib.sha1(chain[j]).hexdigest(), len(chain[j])))
+		self.db.executemany("INSERT INTO certificates VALUES (?, ?, ?, ?, ?)", certificates)
+		self._insertSignature(packageId, package)
+
+	def _insertSignature(self, packageId, package) :
+		features = sisminhash.packageFeatures(package)
+		signature = self.minHash.signature(features)
+		self.db.execute("INSERT INTO signatures VALUES (?, ?)", (packageId, buffer(self.minHash.pack(signature))))
+		if not features :
+			# All the packages without files would share every bucket
+			return
+		bands = self.minHash.bands(signature)
+		self.db.executemany("INSERT INTO signature_bands VALUES (?, ?, ?)",
+			[(packageId, band, bands[band]) for band in range(len(bands))])
+
+	def packagesInstalling(self, targetPath) :
+		"""Returns the packages that install the given file on any drive"""
+		return [r[0] for r in self.db.execute("SELECT DISTINCT p.path FROM files f JOIN packages p ON p.id = f.package_id "
+			"WHERE f.target_key = ? ORDER BY p.path", (sispackage.normalizeTargetPath(targetPath),))]
+
+	def packagesWithCapability(self, capability) :
+		return [r[0] for r in self.db.execute("SELECT DISTINCT p.path FROM capabilities c JOIN packages p ON p.id = c.package_id "
+			"WHERE c.capability = ? ORDER BY p.path", (capability,))]
+
+	def packagesForUid(self, low, high = None) :
+		"""Returns the packages whose UID is in the inclusive range [low, high]"""
+		if high is None :
+			high = low
+		return [r[0] for r in self.db.execute("SELECT path FROM packages WHERE uid BETWEEN ? AND ? ORDER BY path", (low, high))]
+
+	def packagesDependingOn(self, low, high = None) :
+		"""Returns the packages depending on a UID in the inclusive range
+		[low, high]"""
+		if high is None :
+			high = low
+		return [r[0] for r in self.db.execute("SELECT DISTINCT p.path FROM dependencies d JOIN packages p ON p.id = d.package_id "
+			"WHERE d.kind = 'package' AND d.uid BETWEEN ? AND ? AND p.error IS NULL ORDER BY p.path", (low, high))]
+
+	def packagesSimilarTo(self, filename, threshold = 0.5) :
+		"""Returns (similarity, path) of the packages whose estimated Jaccard
+		similarity to the package is at least threshold, most similar first.
+		The similarity is over the install paths and payload digests. Only
+		the packages sharing a band bucket with the package are compared, so
+		packages less similar than the LSH threshold of about
+		(1 / bands) ^ (1 / rows) are likely missed. Packages without files
+		are not in any bucket and not similar to any package."""
+		filename = os.path.abspath(filename)
+		row = self.db.execute("SELECT s.package_id, s.signature FROM packages p JOIN signatures s ON s.package_id = p.id "
+			"WHERE p.path = ?", (filename,)).fetchone()
+		packageId = None
+		if row :
+			packageId = row[0]
+			signature = self.minHash.unpack(row[1])
+		else :
+			signature = self.minHash.signature(sisminhash.packageFeatures(_parsePackage(siscorpus.SISFileSource(filename))))
+		if signature == self.minHash.emptySignature() :
+			# A package without files is not similar to any package
+			return []
+		bands = self.minHash.bands(signature)
+		candidates = set()
+		for band in range(len(bands)) :
+			for r in self.db.execute("SELECT package_id FROM signature_bands WHERE band = ? AND bucket = ?", (band, bands[band])) :
+				candidates.add(r[0])
+		candidates.discard(packageId)
+		result = []
+		for candidate in candidates :
+			(path, data) = self.db.execute("SELECT p.path, s.signature FROM packages p JOIN signatures s ON s.package_id = p.id "
+				"WHERE p.id = ?", (candidate,)).fetchone()
+			value = sisminhash.similarity(signature, self.minHash.unpack(data))
+			if value >= threshold :
+				result.append((value, path))
+		result.sort(lambda a, b : cmp(b[0], a[0]) or cmp(a[1], b[1]))
+		return result
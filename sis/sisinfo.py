@@ -36,10 +36,35 @@ class SISInfo(sisfields.SISField) :
 		sisfields.SISField.__init__(self)
 		self.fin = None
 		self.fileHeader = sisfields.SISFileHeader()
+		self.ioStatistics = None
 		
-	def parse(self, filename) :
-		fin = open(filename, 'rb')
-		fileReader = sisreader.SISFileReader(fin)
+	def parse(self, filename, blockSize = sisreader.DefaultBlockSize, readAhead = sisreader.DefaultReadAhead, 
+			metadataOnly = False, limits = None, skipStoredData = False, skipFileData = False) :
+		"""Parses the SIS file. If metadataOnly is True, the data field holding
+		the file contents is skipped without reading it. limits is the
+		sisreader.SISLimits to enforce, by default sisreader.DefaultLimits.
+		If skipStoredData is True, the contents of the files stored without
+		compression are not read, their compressed fields have data None
+		and dataOffset telling where the contents are in the file, or None
+		if parseStream is given a stream without offsets. skipFileData does
+		the same for the compressed files too."""
+		fin = open(filename, 'rb', 0)
+		try :
+			self.parseStream(fin, blockSize, readAhead, metadataOnly, limits, skipStoredData, skipFileData)
+		finally :
+			fin.close()
+		
+	def parseStream(self, inStream, blockSize = sisreader.DefaultBlockSize, readAhead = sisreader.DefaultReadAhead, 
+			metadataOnly = False, limits = None, skipStoredData = False, skipFileData = False, size = None) :
+		"""Parses the SIS file from a stream. size is the size of the SIS file
+		if known, it is needed to check the field lengths when the stream is
+		not seekable."""
+		fileReader = sisreader.SISFileReader(inStream, blockSize, readAhead, limits, size)
+		if metadataOnly :
+			fileReader.skipFieldTypes = (sisfields.DataField,)
+		fileReader.skipStoredData = skipStoredData
+		fileReader.skipFileData = skipFileData
+		self.ioStatistics = fileReader.stats
 		self.parseHeader(fileReader)
 		self.parseSISFields(fileReader)
 		
@@ -53,3 +78,9 @@ class SISInfo(sisfields.SISField) :
 		parser = sisreader.SISFieldParser()
 		while not fileReader.isEof() :
 			self.subFields.append(parser.parseField(fileReader))
+
+def iterFiles(filename, *args, **kwargs) :
+	"""Yields the files of the SIS file with their contents as lazily read
+	streams, see sisfiles.iterFiles"""
+	import sisfiles
+	return sisfiles.iterFiles(filename, *args, **kwargs)
@@ -0,0 +1,110 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import binascii
+import hashlib
+import random
+import struct
+import sispackage
+
+NumHashes = 64
+NumBands = 16
+Seed = 0x5151
+
+Mask64 = (1 << 64) - 1
+
+def packageFeatures(package) :
+	"""Returns the set of features of the package compared by the MinHash
+	signatures: the normalized install paths and the payload digests, or the
+	sizes of the files that have no digest"""
+	features = set()
+	for f in package.files :
+		features.add("path:" + sispackage.normalizeTargetPath(f.target).encode("utf-8"))
+		if f.hashDigest is not None :
+			features.add("hash:" + binascii.hexlify(f.hashDigest))
+		else :
+			features.add("size:" + str(f.uncompressedLength))
+	return features
+
+def featureHash(feature) :
+	return struct.unpack("<I", hashlib.md5(feature).digest()[:4])[0]
+
+class SISMinHash :
+	"""MinHash signatures of feature sets and their locality sensitive
+	hashing into bands. The i:th value of a signature is the minimum of
+	multiply-shift hash i over the features, so the fraction of equal values
+	of two signatures estimates the Jaccard similarity of the feature sets.
+	Two sets land in the same bucket of some band with the probability
+	1 - (1 - s^r)^b for similarity s, r rows per band and b bands."""
+	def __init__(self, numHashes = NumHashes, numBands = NumBands, seed = Seed) :
+		if numHashes % numBands != 0 :
+			raise Exception("The number of hashes must be a multiple of the number of bands")
+		self.numHashes = numHashes
+		self.numBands = numBands
+		self.rows = numHashes // numBands
+		rng = random.Random(seed)
+		self.coefficients = [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for i in range(numHashes)]
+
+	def signature(self, features) :
+		"""Returns the signature of a feature set. An empty set has all the
+		values 0xffffffff."""
+		values = [featureHash(f) for f in features]
+		if not values :
+			return self.emptySignature()
+		return tuple([min([((a * x + b) & Mask64) >> 32 for x in values]) for (a, b) in self.coefficients])
+
+	def emptySignature(self) :
+		return (0xffffffff,) * self.numHashes
+
+	def bands(self, signature) :
+		"""Returns the bucket of each band of the signature as a signed 64-bit
+		integer, so that it fits an SQLite integer"""
+		result = []
+		for band in range(self.numBands) :
+			rows = signature[band * self.rows:(band + 1) * self.rows]
+			digest = hashlib.sha1(struct.pack("<%dI" % self.rows, *rows)).digest()
+			result.append(struct.unpack("<q", digest[:8])[0])
+		return result
+
+	def pack(self, signature) :
+		return struct.pack("<%dI" % self.numHashes, *signature)
+
+	def unpack(self, data) :
+		return struct.unpack("<%dI" % self.numHashes, str(data))
+
+def similarity(signature1, signature2) :
+	"""Estimated Jaccard similarity of the feature sets of the signatures"""
+	equal = 0
+	for (a, b) in zip(signature1, signature2) :
+		if a == b :
+			equal += 1
+	return float(equal) / len(signature1)
+
+DefaultMinHash = SISMinHash()
@@ -0,0 +1,198 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import sisfields
+
+def normalizeTargetPath(path) :
+	"""Returns the install path without the drive letter in lower case, so
+	that "!:\\sys\\bin\\foo.exe" and "c:\\Sys\\Bin\\foo.exe" compare equal"""
+	path = path.replace("/", "\\")
+	if len(path) >= 2 and path[1] == ":" :
+		path = path[2:]
+	return path.lower()
+
+def capabilityNames(capabilities) :
+	"""Returns the names of the capabilities in a capability bitmask"""
+	return [sisfields.CapabilityNames[i] for i in range(20) if (capabilities >> i) & 0x01]
+
+def versionStr(version, unbounded = "*") :
+	"""Returns a version tuple as a string like 1.2.3, or unbounded if the
+	version is None"""
+	if version is None :
+		return unbounded
+	return ".".join([str(v) for v in version])
+
+def splitCertificates(buf) :
+	"""Splits a buffer of concatenated DER encoded certificates"""
+	result = []
+	while len(buf) >= 2 :
+		length = ord(buf[1])
+		headerLength = 2
+		if length & 0x80 :
+			numBytes = length & 0x7f
+			length = 0
+			for i in range(numBytes) :
+				length = (length << 8) | ord(buf[2 + i])
+			headerLength += numBytes
+		result.append(buf[:headerLength + length])
+		buf = buf[headerLength + length:]
+	return result
+
+def _subField(field, fieldType) :
+	for f in field.subFields :
+		if f and f.type == fieldType :
+			return f
+	return None
+
+def _arrayItems(field) :
+	if field and field.type == sisfields.ArrayField :
+		return field.subFields
+	return []
+
+def _strings(field) :
+	return [f.readableStr() for f in _arrayItems(field)]
+
+class SISPackageFile :
+	def __init__(self, field, block = 0) :
+		self.target = field.subFields[0].readableStr()
+		self.mimeType = field.subFields[1].readableStr()
+		self.capabilities = 0
+		caps = _subField(field, sisfields.CapabilitiesField)
+		if caps :
+			self.capabilities = caps.capabilities
+		self.hashAlgorithm = None
+		self.hashDigest = None
+		hash = _subField(field, sisfields.HashField)
+		if hash :
+			self.hashAlgorithm = hash.algorithm
+			self.hashDigest = hash.subFields[0].data
+		self.operation = field.operation
+		self.operationOptions = field.operationOptions
+		self.compressedLength = field.compressedLength
+		self.uncompressedLength = field.uncompressedLength
+		self.fileIndex = field.fileIndex
+		self.block = block
+
+	def capabilityNames(self) :
+		return capabilityNames(self.capabilities)
+
+class SISPackageDependency :
+	def __init__(self, field) :
+		self.uid = field.subFields[0].uid
+		self.fromVersion = None
+		self.toVersion = None
+		self.names = []
+		for f in field.subFields[1:] :
+			if f.type == sisfields.VersionRangeField :
+				if f.fromVersion :
+					self.fromVersion = f.fromVersion.version
+				if f.toVersion :
+					self.toVersion = f.toVersion.version
+			elif f.type == sisfields.ArrayField :
+				self.names = _strings(f)
+
+class SISPackage :
+	"""Plain summary of the controller of a parsed SIS file"""
+	def __init__(self, sisInfo) :
+		self.uid = sisInfo.fileHeader.uid3
+		self.version = None
+		self.vendor = None
+		self.names = []
+		self.vendorNames = []
+		self.languages = []
+		self.targetDevices = []
+		self.dependencies = []
+		self.files = []
+		self.certificateChains = []
+		self.controller = None
+		self.installBlock = None
+		self.dataIndex = 0
+		self.fileDatas = []
+		for field in sisInfo.subFields :
+			if field and field.type == sisfields.ContentsField :
+				self.controller = _subField(field, sisfields.ControllerField)
+				data = _subField(field, sisfields.DataField)
+				if data and data.subFields :
+					for dataUnit in _arrayItems(data.subFields[0]) :
+						self.fileDatas.append(_arrayItems(dataUnit.subFields[0]))
+		if self.controller :
+			self._parseController(self.controller)
+
+	def _parseController(self, controller) :
+		for field in controller.subFields :
+			if field.type == sisfields.InfoField :
+				self.uid = field.subFields[0].uid
+				self.vendor = field.subFields[1].readableStr()
+				self.names = _strings(field.subFields[2])
+				self.vendorNames = _strings(field.subFields[3])
+				self.version = field.subFields[4].version
+			elif field.type == sisfields.SupportedLanguagesField :
+				self.languages = [f.language for f in _arrayItems(field.subFields[0])]
+			elif field.type == sisfields.PrerequisitiesField :
+				self.targetDevices = [SISPackageDependency(f) for f in _arrayItems(field.subFields[0])]
+				self.dependencies = [SISPackageDependency(f) for f in _arrayItems(field.subFields[1])]
+			elif field.type == sisfields.DataIndexField :
+				self.dataIndex = field.dataIndex
+			elif field.type == sisfields.InstallBlockField :
+				self.installBlock = field
+				self._collectFiles(field, [0])
+			elif field.type == sisfields.SignatureCertificateChainField :
+				chain = _subField(field, sisfields.CertificateChainField)
+				if chain :
+					self.certificateChains.append(splitCertificates(chain.subFields[0].data))
+
+	def _collectFiles(self, installBlock, blockCounter, block = 0) :
+		"""Collects the file descriptions of the install block and its
+		conditional blocks. Each conditional block gets its own block number,
+		the unconditional files belong to block 0."""
+		for f in _arrayItems(installBlock.subFields[0]) :
+			self.files.append(SISPackageFile(f, block))
+		for ifField in _arrayItems(installBlock.subFields[2]) :
+			blockCounter[0] += 1
+			self._collectFiles(ifField.subFields[1], blockCounter, blockCounter[0])
+			for elseIfField in _arrayItems(ifField.subFields[2]) :
+				blockCounter[0] += 1
+				self._collectFiles(elseIfField.subFields[1], blockCounter, blockCounter[0])
+
+	def capabilities(self) :
+		"""Returns the union of the capabilities of all the files"""
+		result = 0
+		for f in self.files :
+			result |= f.capabilities
+		return result
+
+	def payload(self, fileIndex, dataUnit = 0) :
+		"""Returns the uncompressed contents of the file"""
+		return self.fileDatas[dataUnit][fileIndex].subFields[0].data
+
+	def name(self) :
+		if len(self.names) > 0 :
+			return self.names[0]
+		return ""
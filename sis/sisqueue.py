@@ -0,0 +1,237 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+import json
+import time
+import socket
+import sqlite3
+import binascii
+import siscorpus, sispackage
+
+Schema = """
+CREATE TABLE IF NOT EXISTS shards (
+	id INTEGER PRIMARY KEY,
+	status TEXT NOT NULL DEFAULT 'pending',
+	owner TEXT,
+	lease_expires REAL,
+	attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS items (
+	name TEXT PRIMARY KEY,
+	shard_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+	name TEXT PRIMARY KEY,
+	item TEXT NOT NULL,
+	error TEXT,
+	result TEXT,
+	worker TEXT,
+	finished REAL
+);
+CREATE INDEX IF NOT EXISTS shards_status ON shards (status, lease_expires);
+CREATE INDEX IF NOT EXISTS items_shard ON items (shard_id);
+"""
+
+DefaultShardSize = 100
+DefaultLease = 300.0
+BusyTimeout = 60.0
+
+def scanPackage(source) :
+	"""Default scan of a package, returns its summary as a dictionary"""
+	package = sispackage.SISPackage(siscorpus.parseSource(source, metadataOnly = True))
+	version = None
+	if package.version :
+		version = ".".join([str(v) for v in package.version])
+	capabilities = 0
+	for f in package.files :
+		capabilities |= f.capabilities
+	return {
+		"uid" : package.uid,
+		"version" : version,
+		"vendor" : package.vendor,
+		"name" : package.name(),
+		"files" : len(package.files),
+		"size" : sum([f.uncompressedLength for f in package.files]),
+		"capabilities" : capabilities,
+		}
+
+class SISWorkQueue :
+	"""Work queue of a corpus scan in an SQLite file, which may be shared by
+	worker processes on several machines through a shared filesystem.
+
+	The SIS files and archives of the corpus are the items of the queue,
+	split into shards. A worker leases a shard, scans the packages of its
+	items and records the result of each package as soon as it is done,
+	renewing the lease. If a worker dies, its lease expires and another
+	worker takes the shard over, skipping the packages that already have a
+	result."""
+	def __init__(self, dbPath) :
+		self.db = sqlite3.connect(dbPath, timeout = BusyTimeout, isolation_level = None)
+		self.db.executescript(Schema)
+
+	def close(self) :
+		self.db.close()
+
+	def addItems(self, path, shardSize = DefaultShardSize) :
+		"""Adds the SIS files and archives under path that are not yet in the
+		queue, in new shards of shardSize items. Returns the number of items
+		added."""
+		names = []
+		if os.path.isdir(path) :
+			for root, dirs, files in os.walk(path) :
+				dirs.sort()
+				for name in sorted(files) :
+					if siscorpus.isPackageFile(name) or siscorpus.isArchiveFile(name) :
+						names.append(os.path.abspath(os.path.join(root, name)))
+		else :
+			names.append(os.path.abspath(path))
+		self.db.execute("BEGIN IMMEDIATE")
+		try :
+			known = set([r[0] for r in self.db.execute("SELECT name FROM items")])
+			names = [n for n in names if n not in known]
+			for i in range(0, len(names), shardSize) :
+				shardId = self.db.execute("INSERT INTO shards (status) VALUES ('pending')").lastrowid
+				self.db.executemany("INSERT INTO items VALUES (?, ?)", [(n, shardId) for n in names[i:i + shardSize]])
+			self.db.execute("COMMIT")
+		except :
+			self.db.execute("ROLLBACK")
+			raise
+		return len(names)
+
+	def claim(self, owner, lease = DefaultLease) :
+		"""Leases a pending shard, or one whose lease expired, to owner and
+		returns its id, or None if no shard is left"""
+		now = time.time()
+		self.db.execute("BEGIN IMMEDIATE")
+		try :
+			row = self.db.execute("SELECT id FROM shards WHERE status = 'pending' OR "
+				"(status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)).fetchone()
+			if row :
+				self.db.execute("UPDATE shards SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+					"WHERE id = ?", (owner, now + lease, row[0]))
+			self.db.execute("COMMIT")
+		except :
+			self.db.execute("ROLLBACK")
+			raise
+		if row :
+			return row[0]
+		return None
+
+	def renew(self, shardId, owner, lease = DefaultLease) :
+		"""Extends the lease, returns False if the shard was taken over"""
+		cursor = self.db.execute("UPDATE shards SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+			(time.time() + lease, shardId, owner))
+		return cursor.rowcount == 1
+
+	def finish(self, shardId, owner) :
+		"""Marks the shard done, returns False if the shard was taken over"""
+		cursor = self.db.execute("UPDATE shards SET status = 'done', lease_expires = NULL WHERE id = ? AND owner = ? "
+			"AND status = 'leased'", (shardId, owner))
+		return cursor.rowcount == 1
+
+	def items(self, shardId) :
+		return [r[0] for r in self.db.execute("SELECT name FROM items WHERE shard_id = ? ORDER BY name", (shardId,))]
+
+	def isDone(self, name) :
+		return self.db.execute("SELECT 1 FROM results WHERE name = ?", (name,)).fetchone() is not None
+
+	def checkpoint(self, name, item, owner, result = None, error = None) :
+		"""Records the result of a package"""
+		if result is not None :
+			result = json.dumps(result)
+		self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)", (name, item, error, result, owner, time.time()))
+
+	def results(self) :
+		"""Yields (package name, result dictionary or None, error or None)"""
+		for (name, error, result) in self.db.execute("SELECT name, error, result FROM results ORDER BY name") :
+			if result is not None :
+				result = json.loads(result)
+			yield (name, result, error)
+
+	def status(self) :
+		"""Returns (shard counts by status, packages scanned, packages failed)"""
+		shards = dict(self.db.execute("SELECT status, COUNT(*) FROM shards GROUP BY status").fetchall())
+		(scanned, failed) = self.db.execute("SELECT COUNT(*), COUNT(error) FROM results").fetchone()
+		return (shards, scanned, failed)
+
+class SISWorkerStatistics :
+	def __init__(self) :
+		self.shards = 0
+		self.scanned = 0
+		self.skipped = 0
+		self.failed = 0
+		self.lost = 0
+
+	def readableStr(self) :
+		return "shards: " + str(self.shards) + ", scanned: " + str(self.scanned) + ", skipped: " + str(self.skipped) + \
+			", failed: " + str(self.failed) + ", leases lost: " + str(self.lost)
+
+def workerName() :
+	return "%s:%d:%s" % (socket.gethostname(), os.getpid(), binascii.hexlify(os.urandom(4)))
+
+def work(dbPath, lease = DefaultLease, scan = scanPackage, owner = None) :
+	"""Processes shards of the queue until none is left and returns the
+	SISWorkerStatistics. scan is called with each package source and
+	returns the result to record, an exception is recorded as the error."""
+	owner = owner or workerName()
+	queue = SISWorkQueue(dbPath)
+	stats = SISWorkerStatistics()
+	try :
+		shardId = queue.claim(owner, lease)
+		while shardId is not None :
+			if _workShard(queue, shardId, owner, lease, scan, stats) and queue.finish(shardId, owner) :
+				stats.shards += 1
+			else :
+				stats.lost += 1
+			shardId = queue.claim(owner, lease)
+	finally :
+		queue.close()
+	return stats
+
+def _workShard(queue, shardId, owner, lease, scan, stats) :
+	for item in queue.items(shardId) :
+		if not os.path.exists(item) :
+			queue.checkpoint(item, item, owner, error = "File not found")
+			continue
+		for source in siscorpus.findPackageSources(item) :
+			if queue.isDone(source.name) :
+				stats.skipped += 1
+				continue
+			try :
+				result = scan(source)
+				queue.checkpoint(source.name, item, owner, result = result)
+				stats.scanned += 1
+			except Exception, err :
+				queue.checkpoint(source.name, item, owner, error = err.__class__.__name__ + ": " + str(err))
+				stats.failed += 1
+			if not queue.renew(shardId, owner, lease) :
+				return False
+	return True
@@ -30,12 +30,140 @@ THE POSSIBILITY OF SUCH DAMAGE.
 
 
 import struct
+import zlib
 import sisfields
 
+class SISLimitError(Exception) :
+	pass
+
+class SISLimits :
+	"""Limits for parsing untrusted SIS files. A field may never be longer
+	than the bytes remaining in its stream, when the stream size is known.
+	maxFieldLength bounds the field lengths also for streams of unknown
+	size. maxDecompressedSize is the total of the data decompressed into
+	memory by one parse, the data streamed to a payload handler does not
+	count. maxCompressionRatio bounds the uncompressed to compressed size
+	ratio of one field. A limit of None is not checked."""
+	def __init__(self, maxFieldLength = 1 << 32, maxDepth = 64, maxDecompressedSize = 1 << 30, 
+			maxCompressionRatio = None, maxFieldCount = 1000000) :
+		self.maxFieldLength = maxFieldLength
+		self.maxDepth = maxDepth
+		self.maxDecompressedSize = maxDecompressedSize
+		self.maxCompressionRatio = maxCompressionRatio
+		self.maxFieldCount = maxFieldCount
+
+DefaultLimits = SISLimits()
+
+class SISParseContext :
+	"""State of one parse shared by the readers of the parse, used to enforce
+	the limits"""
+	def __init__(self, limits = None) :
+		self.limits = limits or DefaultLimits
+		self.depth = 0
+		self.fieldCount = 0
+		self.decompressedSize = 0
+		
+	def enterField(self) :
+		self.depth += 1
+		self.fieldCount += 1
+		if self.limits.maxDepth is not None and self.depth > self.limits.maxDepth :
+			raise SISLimitError("Field nesting deeper than " + str(self.limits.maxDepth))
+		if self.limits.maxFieldCount is not None and self.fieldCount > self.limits.maxFieldCount :
+			raise SISLimitError("More than " + str(self.limits.maxFieldCount) + " fields")
+			
+	def leaveField(self) :
+		self.depth -= 1
+		
+	def checkFieldLength(self, length, remaining) :
+		if remaining is not None and length > remaining :
+			raise SISLimitError("Field length " + str(length) + " exceeds the remaining " + str(remaining) + " bytes")
+		if self.limits.maxFieldLength is not None and length > self.limits.maxFieldLength :
+			raise SISLimitError("Field length " + str(length) + " exceeds " + str(self.limits.maxFieldLength))
+			
+	def decompress(self, data, uncompressedSize) :
+		"""Decompresses zlib data without producing more than the limits allow"""
+		limit = None
+		if self.limits.maxDecompressedSize is not None :
+			limit = self.limits.maxDecompressedSize - self.decompressedSize
+		if self.limits.maxCompressionRatio is not None :
+			ratioLimit = self.limits.maxCompressionRatio * max(len(data), 1)
+			if limit is None or ratioLimit < limit :
+				limit = ratioLimit
+		if limit is None :
+			result = zlib.decompress(data)
+		else :
+			if uncompressedSize > limit :
+				raise SISLimitError("Uncompressed size " + str(uncompressedSize) + " exceeds the limit of " + str(limit))
+			result = zlib.decompressobj().decompress(data, limit + 1)
+			if len(result) > limit :
+				raise SISLimitError("Decompressed data exceeds the limit of " + str(limit))
+		self.decompressedSize += len(result)
+		return result
+		
+	def checkStreamedSize(self, compressedLength, uncompressedSize) :
+		"""Checks the sizes of a field to be decompressed in pieces and
+		returns the number of bytes it may produce: its uncompressed size,
+		bounded by maxCompressionRatio"""
+		if self.limits.maxCompressionRatio is not None :
+			ratioLimit = self.limits.maxCompressionRatio * max(compressedLength, 1)
+			if uncompressedSize > ratioLimit :
+				raise SISLimitError("Uncompressed size " + str(uncompressedSize) + " exceeds the limit of " + str(ratioLimit))
+		return uncompressedSize
+
+	def decompressChunks(self, chunks, compressedLength, uncompressedSize) :
+		"""Decompresses zlib data from an iterator of compressed chunks,
+		yielding the decompressed data in pieces of at most PayloadChunkSize
+		bytes. The pieces are not kept, so they do not count towards
+		maxDecompressedSize, but a field may not produce more than its
+		uncompressed size."""
+		limit = self.checkStreamedSize(compressedLength, uncompressedSize)
+		decompressor = zlib.decompressobj()
+		produced = 0
+		for chunk in chunks :
+			while chunk :
+				result = decompressor.decompress(chunk, PayloadChunkSize)
+				chunk = decompressor.unconsumed_tail
+				produced += len(result)
+				if produced > limit :
+					raise SISLimitError("Decompressed data exceeds the limit of " + str(limit))
+				if result :
+					yield result
+		result = decompressor.flush()
+		produced += len(result)
+		if produced > limit :
+			raise SISLimitError("Decompressed data exceeds the limit of " + str(limit))
+		if result :
+			yield result
+
 class SISReader :
+	# Types of the fields that the field parser skips without parsing
+	skipFieldTypes = ()
+	# If True, the contents of the files stored without compression are
+	# skipped, the compressed fields only record their offset in the stream
+	skipStoredData = False
+	# If True, the contents of all the files are skipped
+	skipFileData = False
+	# True while the file data field is parsed
+	readingFileData = False
+	# If set, called with the compressed field and an iterator over the
+	# uncompressed contents of each file instead of storing the contents in
+	# the field. dataUnitIndex and fileDataIndex tell which file it is.
+	payloadHandler = None
+	dataUnitIndex = -1
+	fileDataIndex = -1
+	
 	def __init__(self) :
 		pass
 		
+	def remaining(self) :
+		"""Returns the number of bytes left in the stream or None if unknown"""
+		return None
+		
+	def streamOffset(self) :
+		"""Returns the offset of the next byte in the underlying file or None
+		if the reader does not read a file"""
+		return None
+		
 	def readUnsignedBytes(self, numBytes) :
 		buf = self.readPlainBytes(numBytes)
 		if len(buf) < numBytes :
@@ -82,14 +210,93 @@ class SISReader :
 			result = paddingLength
 			
 		return result
+		
+	def skipBytes(self, numBytes) :
+		while numBytes > 0 and not self.isEof() :
+			length = min(numBytes, DefaultBlockSize)
+			self.readPlainBytes(length)
+			numBytes -= length
+			
+	def readChunks(self, numBytes, chunkSize = None) :
+		"""Yields the next numBytes bytes in pieces of at most chunkSize bytes"""
+		chunkSize = chunkSize or PayloadChunkSize
+		while numBytes > 0 :
+			buf = self.readPlainBytes(min(numBytes, chunkSize))
+			if not buf :
+				raise IOError("Unexpected end of SIS file")
+			numBytes -= len(buf)
+			yield buf
 	
 
+DefaultBlockSize = 4096
+DefaultReadAhead = 16
+# Size of the pieces that the file contents are streamed in
+PayloadChunkSize = 1 << 16
+
+class SISReaderStatistics :
+	def __init__(self) :
+		self.syscalls = 0
+		self.bytesRead = 0
+		self.bufferHits = 0
+		self.bypassReads = 0
+		
+	def readableStr(self) :
+		return "syscalls: " + str(self.syscalls) + ", bytes read: " + str(self.bytesRead) + \
+			", buffer hits: " + str(self.bufferHits) + ", bypass reads: " + str(self.bypassReads)
+
 class SISFileReader(SISReader) : 
-	def __init__(self, inStream) :
+	"""Reads from the stream in blocks of blockSize * readAhead bytes and serves
+	the small field reads from the buffer. Reads of at least blockSize bytes
+	bypass the buffer and go to the stream directly."""
+	def __init__(self, inStream, blockSize = DefaultBlockSize, readAhead = DefaultReadAhead, limits = None, size = None) :
 		self.inStream = inStream
 		self.eof = False
 		self.bytesRead = 0
+		self.blockSize = blockSize
+		self.readAhead = max(readAhead, 1)
+		self.buffer = ""
+		self.bufferPos = 0
+		self.stats = SISReaderStatistics()
+		self.context = SISParseContext(limits)
+		self.size = size
+		self.startOffset = None
+		try :
+			pos = inStream.tell()
+			inStream.seek(0, 2)
+			self.size = inStream.tell() - pos
+			inStream.seek(pos)
+			self.startOffset = pos
+		except (AttributeError, IOError) :
+			# Not seekable, the size is known only if given
+			pass
+			
+	def streamOffset(self) :
+		if self.startOffset is None :
+			return None
+		return self.startOffset + self.bytesRead
+			
+	def remaining(self) :
+		if self.size is None :
+			return None
+		return max(self.size - self.bytesRead, 0)
 
+	def _readStream(self, numBytes) :
+		# Read in pieces, as a single read preallocates numBytes, which may
+		# be a corrupt field length when the stream size is not known
+		result = []
+		length = 0
+		while length < numBytes :
+			buf = self.inStream.read(min(numBytes - length, PayloadChunkSize))
+			self.stats.syscalls += 1
+			if not buf :
+				break
+			self.stats.bytesRead += len(buf)
+			result.append(buf)
+			length += len(buf)
+		if len(result) == 1 :
+			return result[0]
+		return "".join(result)
+		
 	def readPlainBytes(self, numBytes) :
 		if self.eof :
 			return ""
@@ -97,23 +304,65 @@ class SISFileReader(SISReader) :
 		if numBytes == 0 :
 			return ""
 			
-		buf = ""
-		buf = self.inStream.read(numBytes)
+		available = len(self.buffer) - self.bufferPos
+		if numBytes <= available :
+			buf = self.buffer[self.bufferPos:self.bufferPos + numBytes]
+			self.bufferPos += numBytes
+			self.stats.bufferHits += 1
+		else :
+			buf = self.buffer[self.bufferPos:]
+			self.buffer = ""
+			self.bufferPos = 0
+			remaining = numBytes - len(buf)
+			if remaining >= self.blockSize :
+				buf += self._readStream(remaining)
+				self.stats.bypassReads += 1
+			else :
+				self.buffer = self._readStream(self.blockSize * self.readAhead)
+				self.bufferPos = min(remaining, len(self.buffer))
+				buf += self.buffer[:self.bufferPos]
+				
 		if len(buf) < numBytes :
 			self.eof = True
+			if buf :
+				# The stream ended inside a field
+				raise IOError("Unexpected end of SIS file, " + str(numBytes) + " bytes expected, " + str(len(buf)) + " read")
 			return ""
 			
 		self.bytesRead += numBytes
 		
 		return buf
 
+	def skipBytes(self, numBytes) :
+		available = len(self.buffer) - self.bufferPos
+		if numBytes <= available or self.eof :
+			SISReader.skipBytes(self, numBytes)
+			return
+		try :
+			self.inStream.seek(numBytes - available, 1)
+		except (AttributeError, IOError) :
+			# Not seekable
+			SISReader.skipBytes(self, numBytes)
+			return
+		self.stats.syscalls += 1
+		self.buffer = ""
+		self.bufferPos = 0
+		self.bytesRead += numBytes
+
 	def isEof(self) :
 		return self.eof
 		
 class SISBufferReader(SISReader) :
-	def __init__(self, buffer) :
+	def __init__(self, buffer, parent = None) :
 		self.buffer = buffer
 		self.bytesRead = 0
+		if parent :
+			self.context = parent.context
+		else :
+			self.context = SISParseContext()
+		
+	def remaining(self) :
+		return max(len(self.buffer) - self.bytesRead, 0)
 		
 	def readPlainBytes(self, numBytes) :
 		if self.isEof() :
@@ -127,24 +376,32 @@ class SISBufferReader(SISReader) :
 		self.bytesRead += numBytes
 		
 		return result
+		
+	def skipBytes(self, numBytes) :
+		self.bytesRead += numBytes
 			
 	def isEof(self) :
 		return self.bytesRead >= len(self.buffer)
 		
 class SISFieldParser :
-	def __init__(self) :
-		self.lastReadBytes = 0
-		
+	"""Parses fields from a reader. The parser has no state, all the state
+	of a parse is in the reader and its SISParseContext, which belong to
+	one parse. Parses with their own readers may thus run concurrently in
+	any number of threads, and a parser may be shared between them."""
 	def parseField(self, fileReader) :
 		"""Reads the next field from the fileReader stream and returns it"""
 		field = None
-		self.lastReadBytes = 0
 		type = fileReader.readBytesAsUint(4)
-		self.lastReadBytes += 4
-		if type != 0 :
+		if type in fileReader.skipFieldTypes :
+			field = sisfields.SISSkippedField()
+			field.type = type
+			field.initFromFile(fileReader)
+			fileReader.skipPadding()
+		elif type != 0 :
 			field = sisfields.SISFieldTypes[type]()
 			field.type = type
+			fileReader.context.enterField()
 			field.initFromFile(fileReader)
-			self.lastReadBytes += field.length + 4 # Field length + length field
-			self.lastReadBytes += fileReader.skipPadding()
+			fileReader.context.leaveField()
+			fileReader.skipPadding()
 		return field
@@ -0,0 +1,166 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import optparse
+import subprocess
+import threading
+import time
+from cStringIO import StringIO
+import sys, os
+
+ScriptDir = os.path.dirname(os.path.abspath(__file__))
+
+# Modules that must not be imported before they are needed
+LazyModules = ["pdb", "pyasn1", "sqlite3", "BaseHTTPServer", "SocketServer", "numpy", "multiprocessing", "json",
+	"tarfile", "zipfile", "mmap", "sis.sisindex", "sis.sisdaemon", "sis.siscorpus", "sis.sisqueue", "sis.sisconvert",
+	"sis.sisexport", "sis.siscaps", "sis.sisdeps", "sis.sisminhash", "sis.sisfiles"]
+
+def _run(args) :
+	"""Runs the command and returns its wall clock time in milliseconds"""
+	devNull = open(os.devnull, "w")
+	start = time.time()
+	subprocess.call(args, stdout=devNull, stderr=devNull, cwd=ScriptDir)
+	elapsed = (time.time() - start) * 1000
+	devNull.close()
+	return elapsed
+
+def _best(args, runs) :
+	return min([_run(args) for i in range(runs)])
+
+def _check(name, value, budget) :
+	result = value <= budget
+	status = "OK"
+	if not result :
+		status = "OVER BUDGET"
+	print "%-12s %8.1f ms (budget %.1f ms) %s" % (name, value, budget, status)
+	return result
+
+def startupBenchmark(options) :
+	"""Measures the interpreter startup, the import of sisinfo.py and the
+	parse of one SIS file in fresh interpreters and compares the import and
+	parse times to their budgets. Returns False if a budget is exceeded or
+	a lazily imported module is imported at startup."""
+	python = sys.executable
+	interpreter = _best([python, "-c", "pass"], options.runs)
+	imported = _best([python, "-c", "import sisinfo"], options.runs)
+	print "%-12s %8.1f ms" % ("interpreter", interpreter)
+	result = _check("import", imported - interpreter, options.import_budget)
+	if options.file :
+		parsed = _best([python, "sisinfo.py", "-f", os.path.abspath(options.file), "-i"], options.runs)
+		result = _check("first parse", parsed - imported, options.parse_budget) and result
+
+	process = subprocess.Popen([python, "-c", "import sys; import sisinfo; print ' '.join(sys.modules.keys())"],
+		stdout=subprocess.PIPE, cwd=ScriptDir)
+	modules = process.communicate()[0].split()
+	for name in LazyModules :
+		if name in modules :
+			print "Imported at startup: " + name
+			result = False
+	return result
+
+def _structure(sisInfo) :
+	"""Returns a summary of the parsed tree to compare parses with"""
+	result = []
+	fields = [sisInfo]
+	while fields :
+		field = fields.pop()
+		if field is None :
+			continue
+		result.append((field.type, field.length, len(getattr(field, "data", None) or "")))
+		fields.extend(field.subFields)
+	return result
+
+def _parseLoop(data, count, reference, errors) :
+	from sis import sisinfo
+	for i in range(count) :
+		sisInfo = sisinfo.SISInfo()
+		sisInfo.parseStream(StringIO(data))
+		if _structure(sisInfo) != reference :
+			errors.append("Parse result differs from the single threaded one")
+			return
+
+def threadsBenchmark(options) :
+	"""Parses the SIS file from memory options.iterations times split over
+	an increasing number of threads and prints the throughput and the
+	speedup over one thread. Each parse is compared to a single threaded
+	parse, a difference fails the benchmark. The speedup is bounded by the
+	GIL unless the interpreter runs without it."""
+	from sis import sisinfo
+	if not options.file :
+		print "The threads benchmark needs a SIS file (-f)"
+		return False
+	data = open(options.file, "rb").read()
+	sisInfo = sisinfo.SISInfo()
+	sisInfo.parseStream(StringIO(data))
+	reference = _structure(sisInfo)
+	gil = getattr(sys, "_is_gil_enabled", lambda : True)()
+	print "GIL enabled: " + str(gil)
+	result = True
+	single = None
+	for count in [int(c) for c in options.threads.split(",")] :
+		errors = []
+		perThread = max(options.iterations // count, 1)
+		threads = [threading.Thread(target=_parseLoop, args=(data, perThread, reference, errors)) for i in range(count)]
+		start = time.time()
+		for t in threads :
+			t.start()
+		for t in threads :
+			t.join()
+		rate = perThread * count / (time.time() - start)
+		if single is None :
+			single = rate
+		print "%3d threads %10.1f parses/s  speedup %.2f" % (count, rate, rate / single)
+		for error in errors :
+			print "ERROR : " + error
+			result = False
+	return result
+
+Benchmarks = {
+	"startup" : startupBenchmark,
+	"threads" : threadsBenchmark,
+	}
+
+OptionList = [
+	optparse.make_option("-f", "--file", help="SIS file to parse", metavar="FILENAME"),
+	optparse.make_option("-r", "--runs", help="Number of runs, the best one is reported", metavar="COUNT", type="int", default=5),
+	optparse.make_option("--import-budget", help="Budget for importing sisinfo.py", metavar="MS", type="float", default=30.0),
+	optparse.make_option("--parse-budget", help="Budget for parsing the SIS file", metavar="MS", type="float", default=100.0),
+	optparse.make_option("--threads", help="Comma separated thread counts of the threads benchmark", metavar="COUNTS", default="1,2,4,8"),
+	optparse.make_option("-n", "--iterations", help="Number of parses of the threads benchmark per thread count", metavar="COUNT", type="int", default=2000),
+	]
+
+if __name__ == "__main__" :
+	parser = optparse.OptionParser(option_list=OptionList, usage="%prog [options] " + " | ".join(sorted(Benchmarks.keys())))
+	(options, args) = parser.parse_args(sys.argv)
+	if len(args) != 2 or args[1] not in Benchmarks :
+		parser.print_help()
+		sys.exit(2)
+	if not Benchmarks[args[1]](options) :
+		sys.exit(1)
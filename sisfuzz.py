@@ -0,0 +1,168 @@
+"""
+Copyright (c) 2006, Jari Sukanen
+All rights reserved.
+
+Redistribution and use in source and binary forms, with or 
+without modification, are permitted provided that the following 
+conditions are met:
+	* Redistributions of source code must retain the above copyright 
+	  notice, this list of conditions and the following disclaimer.
+    * Redistributions in binary form must reproduce the above copyright 
+	  notice, this list of conditions and the following disclaimer in 
+	  the documentation and/or other materials provided with the 
+	  distribution.
+    * Names of the contributors may not be used to endorse or promote 
+	  products derived from this software without specific prior written 
+	  permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS 
+"AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED 
+TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR 
+PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS 
+BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR 
+CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF 
+SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS 
+INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN 
+CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) 
+ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF 
+THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+from sis import sisinfo, sisreader, sisfields
+from cStringIO import StringIO
+import optparse
+import random
+import resource
+import struct
+import time
+import traceback
+import sys, os
+
+InterestingValues = [0, 1, 0x7f, 0x80, 0xff, 0x7fff, 0xffff, 0x7fffffff, 0x80000000, 0xffffffff]
+
+def flipBits(data, rng) :
+	data = bytearray(data)
+	for i in range(rng.randint(1, 8)) :
+		pos = rng.randrange(len(data))
+		data[pos] ^= 1 << rng.randrange(8)
+	return str(data)
+
+def overwriteWord(data, rng) :
+	pos = rng.randrange(max(len(data) // 4, 1)) * 4
+	value = rng.choice(InterestingValues + [len(data), rng.getrandbits(32)])
+	return data[:pos] + struct.pack("<I", value) + data[pos + 4:]
+
+def truncate(data, rng) :
+	return data[:rng.randrange(len(data))]
+
+def duplicateChunk(data, rng) :
+	start = rng.randrange(len(data))
+	end = min(start + rng.randint(1, 64), len(data))
+	return data[:end] + data[start:end] + data[end:]
+
+Mutators = [flipBits, overwriteWord, truncate, duplicateChunk]
+
+def parseFile(data, limits) :
+	sisInfo = sisinfo.SISInfo()
+	sisInfo.parseStream(StringIO(data), limits = limits)
+
+def parseController(data, limits) :
+	reader = sisreader.SISBufferReader(data)
+	reader.context = sisreader.SISParseContext(limits)
+	parser = sisreader.SISFieldParser()
+	while parser.parseField(reader) :
+		pass
+
+def controllerData(filename) :
+	"""Returns the uncompressed controller of the SIS file"""
+	fin = open(filename, "rb")
+	reader = sisreader.SISFileReader(fin)
+	sisinfo.SISInfo().parseHeader(reader)
+	reader.readBytesAsUint(4) # contents type
+	sisfields.SISField().readFieldLength(reader)
+	parser = sisreader.SISFieldParser()
+	field = parser.parseField(reader)
+	while field and field.type != sisfields.CompressedField :
+		field = parser.parseField(reader)
+	fin.close()
+	if field :
+		return field.data
+	return None
+
+class FuzzResults :
+	def __init__(self, name) :
+		self.name = name
+		self.runs = 0
+		self.bytes = 0
+		self.ok = 0
+		self.limited = 0
+		self.errors = {}
+		self.time = 0.0
+
+	def readableStr(self) :
+		buf = "%s: %d runs, %.0f runs/s, %.2f MB/s, %d parsed, %d stopped by limits, %d other errors" % (self.name,
+			self.runs, self.runs / max(self.time, 1e-9), self.bytes / max(self.time, 1e-9) / 1e6, self.ok, self.limited,
+			sum(self.errors.values()))
+		for name in sorted(self.errors.keys()) :
+			buf += "\n   %s: %d" % (name, self.errors[name])
+		return buf
+
+def fuzz(name, parse, seeds, options, limits, rng) :
+	results = FuzzResults(name)
+	reported = set()
+	for i in range(options.iterations) :
+		data = rng.choice(seeds)
+		for j in range(rng.randint(1, 3)) :
+			if len(data) == 0 :
+				break
+			data = rng.choice(Mutators)(data, rng)
+		start = time.time()
+		try :
+			parse(data, limits)
+			results.ok += 1
+		except sisreader.SISLimitError :
+			results.limited += 1
+		except Exception, err :
+			errorName = err.__class__.__name__
+			if err.__class__.__module__ != "exceptions" :
+				errorName = err.__class__.__module__ + "." + errorName
+			results.errors[errorName] = results.errors.get(errorName, 0) + 1
+			if options.verbose and errorName not in reported :
+				reported.add(errorName)
+				traceback.print_exc()
+			if options.save :
+				out = open(os.path.join(options.save, "%s-%d-%s.sis" % (name, i, errorName)), "wb")
+				out.write(data)
+				out.close()
+		results.time += time.time() - start
+		results.runs += 1
+		results.bytes += len(data)
+	return results
+
+OptionList = [
+	optparse.make_option("-n", "--iterations", help="Number of mutated inputs per target", metavar="COUNT", type="int", default=1000),
+	optparse.make_option("--seed", help="Random seed", type="int", default=0),
+	optparse.make_option("--max-field-length", help="Maximum field length", metavar="BYTES", type="int", default=sisreader.DefaultLimits.maxFieldLength),
+	optparse.make_option("--max-depth", help="Maximum field nesting depth", metavar="COUNT", type="int", default=sisreader.DefaultLimits.maxDepth),
+	optparse.make_option("--max-decompressed", help="Maximum decompressed bytes per parse", metavar="BYTES", type="int", default=sisreader.DefaultLimits.maxDecompressedSize),
+	optparse.make_option("--max-ratio", help="Maximum compression ratio", metavar="RATIO", type="int", default=sisreader.DefaultLimits.maxCompressionRatio),
+	optparse.make_option("--max-fields", help="Maximum number of fields", metavar="COUNT", type="int", default=sisreader.DefaultLimits.maxFieldCount),
+	optparse.make_option("--save", help="Save the inputs causing other errors than limit errors to DIR", metavar="DIR"),
+	optparse.make_option("-v", "--verbose", help="Print the first traceback of each error type", action="store_true", default=False),
+	]
+
+if __name__ == "__main__" :
+	parser = optparse.OptionParser(option_list=OptionList, usage="%prog [options] SEEDFILE...")
+	(options, args) = parser.parse_args()
+	if len(args) == 0 :
+		parser.print_help()
+		sys.exit(2)
+	limits = sisreader.SISLimits(options.max_field_length, options.max_depth, options.max_decompressed,
+		options.max_ratio, options.max_fields)
+	rng = random.Random(options.seed)
+	files = [open(f, "rb").read() for f in args]
+	controllers = [c for c in [controllerData(f) for f in args] if c]
+	print fuzz("file", parseFile, files, options, limits, rng).readableStr()
+	if controllers :
+		print fuzz("controller", parseController, controllers, options, limits, rng).readableStr()
+	print "Peak memory: %d kB" % resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
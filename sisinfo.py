@@ -28,17 +28,28 @@ ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF
 THE POSSIBILITY OF SUCH DAMAGE.
 """
 
-from sis import sisinfo, sisfields
+from sis import sisinfo, sisfields, sisreader
 import optparse
+import codecs
 import sys, os
 
-PyASN1Availabe = True
+# PyASN1 is imported on first use by importPyASN1, it is needed only for
+# the certificate information.
+decoder = None
+base = None
 
-try :
-    from pyasn1.codec.der import decoder
-    from pyasn1.type import univ, base
-except :
-    PyASN1Availabe = False
+def importPyASN1() :
+	"""Imports PyASN1 if not yet imported, returns False if it is not available"""
+	global decoder, base
+	if decoder is None :
+		try :
+			from pyasn1.codec.der import decoder as derDecoder
+			from pyasn1.type import base as asn1Base
+		except ImportError :
+			return False
+		decoder = derDecoder
+		base = asn1Base
+	return True
 
 def _findItem(item, itemParent, index, objectIdentifier) :
 	if isinstance(item, base.AbstractSimpleAsn1Item) :
@@ -113,14 +124,14 @@ class Handler :
 		elif field.type == sisfields.SignatureCertificateChainField  :
 			self.signatureCertificateChains.append(field)
 
-    def execute(self, options) :
+    def execute(self, options, out = sys.stdout, extractor = None) :
         for f in self.files :
 			if options.info :
 				buf = "   " + f.findField(sisfields.StringField)[0].readableStr()
 				caps = f.findField(sisfields.CapabilitiesField)[0]
 				if caps :
 					buf += " [" + " ".join(f.findField(sisfields.CapabilitiesField)[0].readableCaps) + "]"
-				print buf
+				print >> out, buf
 			if options.extract :
 				parts = f.findField(sisfields.StringField)[0].readableStr().split("\\")
 				if len(parts[len(parts) - 1]) > 0 :
@@ -128,27 +139,31 @@ class Handler :
 					path += os.sep + os.sep.join(parts[1:-1])
 					if not os.path.exists(path) :
 						os.makedirs(path)
-					newFile = file(path + os.sep + parts[len(parts) - 1], "wb")
-					newFile.write(self.fileDatas[f.fileIndex].findField(sisfields.CompressedField)[0].data)
-					newFile.close()
+					compressed = self.fileDatas[f.fileIndex].findField(sisfields.CompressedField)[0]
+					if extractor :
+						extractor.extract(compressed, path + os.sep + parts[len(parts) - 1])
+					else :
+						newFile = file(path + os.sep + parts[len(parts) - 1], "wb")
+						newFile.write(compressed.data)
+						newFile.close()
         for s in self.signatureCertificateChains :
             if options.certificate:
                 buf = s.findField(sisfields.CertificateChainField)[0].subFields[0].data
-                print "Certificate chain:"
+                print >> out, "Certificate chain:"
                 i = 1
                 while len(buf) > 0 :
-					print "   Certificate " + str(i) + ":"
+					print >> out, "   Certificate " + str(i) + ":"
 					i += 1
 					decoded = decoder.decode(buf)
 					cer = CertificateInfo()
 					cer.parse(decoded[0])
 					readableStr = cer.readableStr()
-					print "      " + "\n      ".join(readableStr.split('\n'))
+					print >> out, "      " + "\n      ".join(readableStr.split('\n'))
 					buf = decoded[1]
 			
 class ContentPrinter :
-	def __init__(self) :
-		pass
+	def __init__(self, out = sys.stdout) :
+		self.out = out
 		
 	def handleField(self, field, depth) :
 		buf = ""
@@ -157,14 +172,33 @@ class ContentPrinter :
 		buf += sisfields.FieldNames[field.type] + " "
 		if len(field.readableStr()) > 0 :
 			buf += field.readableStr()
-		print buf
+		print >> self.out, buf
 
 OptionList = [
-	optparse.make_option("-f", "--file", help="Name of the SIS file to inspect", metavar="FILENAME"),
+	optparse.make_option("-f", "--file", help="Name of the SIS file to inspect, - for standard input", metavar="FILENAME"),
 	optparse.make_option("-i", "--info", help="Print information about SIS contents", action="store_true", default=False),
 	optparse.make_option("-s", "--structure", help="Print SIS file structure", action="store_true", default=False),
 	optparse.make_option("-e", "--extract", help="Extract the files from the SIS file to PATH", metavar="PATH"),
 	optparse.make_option("-c", "--certificate", help="Print certificate information", action="store_true", default=False),
+	optparse.make_option("--block-size", help="Read the SIS file in blocks of SIZE bytes", metavar="SIZE", type="int", default=sisreader.DefaultBlockSize),
+	optparse.make_option("--read-ahead", help="Number of blocks to read ahead", metavar="COUNT", type="int", default=sisreader.DefaultReadAhead),
+	optparse.make_option("--io-stats", help="Print I/O statistics of the parse", action="store_true", default=False),
+	optparse.make_option("--to-tar", help="Write the files of the SIS file as a tar archive to PATH, - for standard output", metavar="PATH"),
+	optparse.make_option("--to-zip", help="Write the files of the SIS file as a zip archive to PATH, - for standard output", metavar="PATH"),
+	optparse.make_option("--memory-budget", help="With daemon command, memory budget of the parsed file cache in megabytes", metavar="MB", type="int", default=256),
+	optparse.make_option("-q", "--quiet", help="With daemon command, do not log the requests", action="store_true", default=False),
+	optparse.make_option("--min-similarity", help="With query similar, minimum estimated similarity of the packages listed", metavar="VALUE", type="float", default=0.5),
+	optparse.make_option("--shard-size", help="With queue command, number of files per shard", metavar="COUNT", type="int", default=100),
+	optparse.make_option("--lease", help="With work command, seconds a shard stays leased without progress", metavar="SECONDS", type="float", default=300.0),
+	optparse.make_option("--workers", help="With work command, number of worker processes", metavar="COUNT", type="int", default=1),
+	optparse.make_option("--estimate", help="With compression command, estimate the sizes at the highest compression level from samples", action="store_true", default=False),
+	optparse.make_option("--samples", help="With compression command, number of samples per file", metavar="COUNT", type="int", default=8),
+	optparse.make_option("--max-field-length", help="Maximum field length", metavar="BYTES", type="int", default=sisreader.DefaultLimits.maxFieldLength),
+	optparse.make_option("--max-depth", help="Maximum field nesting depth", metavar="COUNT", type="int", default=sisreader.DefaultLimits.maxDepth),
+	optparse.make_option("--max-decompressed", help="Maximum bytes decompressed into memory per parse", metavar="BYTES", type="int", default=sisreader.DefaultLimits.maxDecompressedSize),
+	optparse.make_option("--max-ratio", help="Maximum compression ratio", metavar="RATIO", type="int", default=sisreader.DefaultLimits.maxCompressionRatio),
+	optparse.make_option("--max-fields", help="Maximum number of fields", metavar="COUNT", type="int", default=sisreader.DefaultLimits.maxFieldCount),
+	optparse.make_option("--verify-hashes", help="With index command, hash also the files whose size and modification time are unchanged", action="store_true", default=False),
 	]
 	
 def validateArguments(options, args) :
@@ -172,31 +206,316 @@ def validateArguments(options, args) :
     if not options.file :
 		result = False
 		raise Exception("Filename must be defined")
-    if not (options.structure or options.extract or options.info or options.certificate) :
+    if options.to_tar or options.to_zip :
+		if options.structure or options.extract or options.info or options.certificate or (options.to_tar and options.to_zip) :
+			raise Exception("--to-tar and --to-zip can't be used with other switches than --io-stats")
+    elif not (options.structure or options.extract or options.info or options.certificate or options.io_stats) :
 		result = False
-		raise Exception("At least one of the switches: -s, -e, -i, or -c must be defined")
-    if options.certificate and not PyASN1Availabe :
+		raise Exception("At least one of the switches: -s, -e, -i, -c, --to-tar, --to-zip or --io-stats must be defined")
+    if options.block_size <= 0 :
+		raise Exception("Block size must be positive")
+    if options.certificate and not importPyASN1() :
         raise Exception("PyASN1 not available, can't use -c switch. See http://pyasn1.sourceforge.net/")
     return result
 
-import pdb
-    
+def indexCommand(options, args) :
+	from sis import sisindex
+	index = sisindex.SISIndex(args[1])
+	stats = index.update(args[0], options.verify_hashes)
+	index.close()
+	print "Indexed " + args[0] + ": " + stats.readableStr()
+
+def queueCommand(options, args) :
+	from sis import sisqueue
+	queue = sisqueue.SISWorkQueue(args[1])
+	added = queue.addItems(args[0], options.shard_size)
+	queue.close()
+	print "Queued " + str(added) + " new files from " + args[0]
+
+def _worker(dbPath, lease, results) :
+	from sis import sisqueue
+	try :
+		results.put(sisqueue.work(dbPath, lease).readableStr())
+	except Exception, err :
+		results.put("ERROR : " + err.__class__.__name__ + ": " + str(err))
+
+def workCommand(options, args) :
+	from sis import sisqueue
+	if options.workers <= 1 :
+		print sisqueue.work(args[0], options.lease).readableStr()
+		return
+	import multiprocessing
+	results = multiprocessing.Queue()
+	workers = [multiprocessing.Process(target=_worker, args=(args[0], options.lease, results)) for i in range(options.workers)]
+	for w in workers :
+		w.start()
+	# Each worker puts one result, read before joining as a worker does not
+	# exit until its result has been taken from the queue
+	for w in workers :
+		print results.get()
+	for w in workers :
+		w.join()
+
+def statusCommand(options, args) :
+	from sis import sisqueue
+	queue = sisqueue.SISWorkQueue(args[0])
+	(shards, scanned, failed) = queue.status()
+	queue.close()
+	print "Shards: " + ", ".join(["%s %d" % (s, shards.get(s, 0)) for s in ("pending", "leased", "done")])
+	print "Packages scanned: " + str(scanned) + ", failed: " + str(failed)
+
+def cyclesCommand(options, args) :
+	from sis import sisindex, sisdeps
+	if os.path.isdir(args[0]) :
+		(graph, failed) = sisdeps.collectDependencies(args[0])
+		for (filename, err) in failed :
+			print "ERROR : " + filename + ": " + str(err)
+	else :
+		try :
+			index = sisindex.SISIndex(args[0], create = False)
+		except IOError, err :
+			print "ERROR : " + str(err)
+			return 1
+		graph = sisdeps.loadDependencyGraph(index)
+		index.close()
+	for cycle in graph.cycles() :
+		print " -> ".join(cycle + cycle[:1])
+
+def queryCommand(options, args) :
+	from sis import sisindex
+	try :
+		index = sisindex.SISIndex(args[0], create = False)
+	except IOError, err :
+		print "ERROR : " + str(err)
+		return 1
+	if args[1] == "installs" :
+		result = index.packagesInstalling(args[2])
+	elif args[1] == "capability" :
+		result = index.packagesWithCapability(args[2])
+	elif args[1] == "uid" :
+		(low, high) = sisindex.parseUidPattern(args[2])
+		result = index.packagesForUid(low, high)
+	elif args[1] == "similar" :
+		result = ["%.2f %s" % (value, path) for (value, path) in index.packagesSimilarTo(args[2], options.min_similarity)]
+	elif args[1] == "missing" :
+		from sis import sisdeps, sispackage
+		path = os.path.abspath(args[2])
+		graph = sisdeps.loadPackageDependencies(index, path)
+		if graph is None :
+			raise Exception("Package not in index: " + args[2])
+		result = [key + ": " + hex(uid) + " " + sispackage.versionStr(fromVersion) + " - " + sispackage.versionStr(toVersion)
+			for (key, uid, fromVersion, toVersion) in graph.missing(path)]
+	elif args[1] == "dependents" :
+		(low, high) = sisindex.parseUidPattern(args[2])
+		result = index.packagesDependingOn(low, high)
+	else :
+		raise Exception("Unknown query: " + args[1])
+	index.close()
+	for path in result :
+		print path
+
+def _printRoute(options) :
+	def route(entry, params, out) :
+		if options.certificate and not importPyASN1() :
+			from sis import sisdaemon
+			raise sisdaemon.SISRequestError(501, "PyASN1 not available")
+		out = codecs.getwriter("utf-8")(out)
+		handler = Handler()
+		entry.sisInfo.traverse(handler)
+		handler.execute(options, out)
+		return "text/plain; charset=utf-8"
+	return route
+
+def _structureRoute(entry, params, out) :
+	entry.sisInfo.traverse(ContentPrinter(codecs.getwriter("utf-8")(out)))
+	return "text/plain; charset=utf-8"
+
+DaemonRoutes = {
+	"info" : _printRoute(optparse.Values({"info" : True, "extract" : None, "certificate" : False})),
+	"certificate" : _printRoute(optparse.Values({"info" : False, "extract" : None, "certificate" : True})),
+	"structure" : _structureRoute,
+	}
+
+def daemonCommand(options, args) :
+	from sis import sisdaemon
+	try :
+		server = sisdaemon.createServer(args[0], DaemonRoutes, options.memory_budget * 1024 * 1024, options.quiet,
+			parseLimits(options))
+	except Exception, err :
+		print "ERROR : " + str(err)
+		return 1
+	print "Serving on " + args[0]
+	try :
+		server.serve_forever()
+	except KeyboardInterrupt :
+		pass
+
+def diffCommand(options, args) :
+	from sis import sisdiff
+	diff = sisdiff.SISDiff(args[0], args[1])
+	print diff.readableStr()
+	if diff.hasChanges() :
+		return 1
+	return 0
+
+def exportCommand(options, args) :
+	from sis import sisexport, siscorpus
+	failed = []
+	if os.path.isfile(args[0]) and not siscorpus.isPackageFile(args[0]) and not siscorpus.isArchiveFile(args[0]) :
+		from sis import sisindex
+		index = sisindex.SISIndex(args[0], create = False)
+		columns = sisexport.indexFileColumns(index)
+		index.close()
+	else :
+		(columns, failed) = sisexport.collectFileColumns(args[0])
+	for (filename, err) in failed :
+		print "ERROR : " + filename + ": " + str(err)
+	columns.save(args[1])
+	print "Exported " + str(columns.rows()) + " files of " + str(len(columns.columns["package_uid"])) + " packages to " + args[1]
+
+def footprintCommand(options, args) :
+	from sis import sisfootprint
+	def printFootprint(filename, footprint) :
+		print filename + ":"
+		print "   " + "\n   ".join(footprint.readableStr().split("\n"))
+	(total, failed) = sisfootprint.corpusFootprint(args[0], printFootprint)
+	for (filename, err) in failed :
+		print "ERROR : " + filename + ": " + str(err)
+	if total.packages > 1 :
+		print "Total of " + str(total.packages) + " packages:"
+		print "   " + "\n   ".join(total.readableStr().split("\n"))
+
+def compressionCommand(options, args) :
+	from sis import siscompress
+	def printReport(filename, report) :
+		print filename + ":"
+		print "   " + "\n   ".join(report.readableStr().split("\n"))
+	(total, failed) = siscompress.corpusCompression(args[0], options.estimate, options.samples, printReport)
+	for (filename, err) in failed :
+		print "ERROR : " + filename + ": " + str(err)
+	if total.packages > 1 :
+		print "Total of " + str(total.packages) + " packages:"
+		print "   " + "\n   ".join(total.readableStr(False).split("\n"))
+
+def conflictsCommand(options, args) :
+	from sis import sisconflicts
+	(index, failed) = sisconflicts.findConflicts(args[0])
+	for (filename, err) in failed :
+		print "ERROR : " + filename + ": " + str(err)
+	conflicts = index.conflicts()
+	for conflict in conflicts :
+		print conflict.readableStr()
+	identical = len([c for c in conflicts if c.identical])
+	print "Conflicting paths: " + str(len(conflicts)) + ", identical: " + str(identical) + \
+		", different: " + str(len(conflicts) - identical)
+
+def parseLimits(options) :
+	return sisreader.SISLimits(options.max_field_length, options.max_depth, options.max_decompressed,
+		options.max_ratio, options.max_fields)
+
+def binaryStream(stream) :
+	"""Sets the standard stream to binary mode on Windows"""
+	try :
+		import msvcrt
+		msvcrt.setmode(stream.fileno(), os.O_BINARY)
+	except ImportError :
+		pass
+	return stream
+
+def convert(options) :
+	from sis import sisconvert
+	inStream = None
+	if options.file == "-" :
+		inStream = binaryStream(sys.stdin)
+	else :
+		inStream = open(options.file, "rb", 0)
+	path = options.to_tar or options.to_zip
+	out = None
+	messages = sys.stdout
+	if path == "-" :
+		out = binaryStream(sys.stdout)
+		messages = sys.stderr
+	else :
+		out = open(path, "wb")
+	if options.to_tar :
+		writer = sisconvert.SISTarWriter(out)
+	else :
+		writer = sisconvert.SISZipWriter(out)
+	converter = sisconvert.SISStreamConverter(writer)
+	converter.convert(inStream, options.block_size, options.read_ahead, parseLimits(options))
+	if out != sys.stdout :
+		out.close()
+	for name in converter.skipped :
+		print >> messages, "Skipped " + name + ", the file is already in the archive with another name"
+	if options.io_stats :
+		print >> messages, "I/O statistics: " + converter.sisInfo.ioStatistics.readableStr()
+
+# Command name : (number of arguments, argument usage, function)
+Commands = {
+	"compression" : (1, "FILE | DIR", compressionCommand),
+	"conflicts" : (1, "FILE | DIR", conflictsCommand),
+	"cycles" : (1, "DB | DIR", cyclesCommand),
+	"daemon" : (1, "PORT | HOST:PORT | SOCKET", daemonCommand),
+	"diff" : (2, "OLD NEW", diffCommand),
+	"export" : (2, "FILE | DIR | DB OUTDIR", exportCommand),
+	"footprint" : (1, "FILE | DIR", footprintCommand),
+	"index" : (2, "DIR DB", indexCommand),
+	"query" : (3, "DB installs PATH | capability NAME | uid UID | similar FILE | missing PATH | dependents UID", queryCommand),
+	"queue" : (2, "DIR QUEUE", queueCommand),
+	"status" : (1, "QUEUE", statusCommand),
+	"work" : (1, "QUEUE", workCommand),
+	}
+
+def validateCommand(options, args) :
+	(numArgs, usage, function) = Commands[args[1]]
+	if len(args) - 2 != numArgs :
+		raise Exception("Usage: " + args[1] + " " + usage)
+	if args[1] == "compression" and options.samples < 1 :
+		raise Exception("Number of samples must be positive")
+	return True
+
+Usage = "%prog [options]\n" + "\n".join(["       %prog " + name + " " + Commands[name][1] for name in sorted(Commands.keys())])
+
 if __name__ == "__main__" :
-	parser = optparse.OptionParser(option_list=OptionList, version="%prog v0.2")
+	parser = optparse.OptionParser(option_list=OptionList, usage=Usage, version="%prog v0.2")
 	(options, args) = parser.parse_args(sys.argv)
+	command = None
+	if len(args) > 1 and args[1] in Commands :
+		command = Commands[args[1]][2]
 	validArguments = False
 	try :
-		validArguments = validateArguments(options, args)
+		if command :
+			validArguments = validateCommand(options, args)
+		else :
+			validArguments = validateArguments(options, args)
 	except Exception, err:
 		print "ERROR : " + str(err) + "\n"
 		parser.print_help()
 	
-	if validArguments :
+	if validArguments and command :
+		sys.exit(command(options, args[2:]))
+	elif validArguments and (options.to_tar or options.to_zip) :
+		convert(options)
+	elif validArguments :
 		sisInfo = sisinfo.SISInfo()
-		sisInfo.parse(options.file)
+		if options.file == "-" :
+			sisInfo.parseStream(binaryStream(sys.stdin), options.block_size, options.read_ahead, limits = parseLimits(options))
+		else :
+			sisInfo.parse(options.file, options.block_size, options.read_ahead, limits = parseLimits(options),
+				skipStoredData = bool(options.extract))
 		if options.structure :
 			handler = ContentPrinter()
 			sisInfo.traverse(handler)
 		handler = Handler()
 		sisInfo.traverse(handler)
-		handler.execute(options)
+		extractor = None
+		if options.extract and options.file != "-" :
+			from sis import sisextract
+			extractor = sisextract.SISExtractor(options.file)
+		handler.execute(options, extractor = extractor)
+		if options.io_stats :
+			print "I/O statistics: " + sisInfo.ioStatistics.readableStr()
+			if extractor :
+				print "Extraction statistics: " + extractor.stats.readableStr()
+		if extractor :
+			extractor.close()